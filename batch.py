@@ -0,0 +1,283 @@
+import datetime
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from certificate_manager import CertificateManager, certificate_path, render_qr, timed_stage
+from certificate_template import template_for
+from drive_uploader import PERMISSION_BATCH_SIZE, DriveUploader, drive_link_for
+from journal import PUBLIC, RENDERED, UPLOADED
+from metrics import METRICS
+from roster_import import read_roster
+
+# generateIds accepts at most 1000 IDs per request
+ID_CHUNK_SIZE = 1000
+
+
+def render_job(certificate_data, qr_data, pdf_filename, pdf_profile="compact"):
+    """Render one certificate in a worker process.
+
+    The QR code and PDF are built in memory and the PDF is written to
+    disk once. Returns the PDF bytes, so the upload does not read the
+    file back, together with the stage timings and the QR version.
+    """
+    timings = {}
+    with timed_stage(timings, 'qr'):
+        qr = render_qr(qr_data)
+    with timed_stage(timings, 'render'):
+        pdf_bytes = CertificateManager.render_certificate(certificate_data, qr, template_for(pdf_profile))
+    with timed_stage(timings, 'write'):
+        with open(pdf_filename, "wb") as f:
+            f.write(pdf_bytes)
+    return pdf_bytes, timings, qr.version
+
+
+class BatchIssuer:
+    """Issue certificates for a whole roster.
+
+    Rendering runs in a process pool sized to the core count. Finished
+    renders go through a bounded queue to the upload thread, which feeds
+    a DriveUploader so Drive uploads overlap with rendering of the
+    following rows. Permission grants are sent in batches of up to 100.
+
+    With a Journal, every row's Drive file ID is recorded before any work
+    starts and each finished stage is recorded as it completes. Running
+    the same roster again skips certificates that were already made
+    public and resumes the rest from their last stage under the same
+    file ID, so an interrupted batch never leaves duplicate Drive files.
+    """
+
+    def __init__(self, cert_manager, workers=None, queue_size=None, output_dir="certificates",
+                 uploader=None, upload_concurrency=4, journal=None):
+        self.cert_manager = cert_manager
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or self.workers * 2
+        self.output_dir = output_dir
+        self.uploader = uploader or DriveUploader.from_manager(
+            cert_manager, max_concurrency=upload_concurrency
+        )
+        self.journal = journal
+        self._reserved_ids = []
+
+    def _next_file_id(self):
+        if not self._reserved_ids:
+            self._reserved_ids = self.uploader.reserve_ids(ID_CHUNK_SIZE)
+        return self._reserved_ids.pop()
+
+    def _upload_worker(self, upload_queue, results, report):
+        in_flight = []
+        uploaded = []
+
+        def finish(result):
+            results.append(result)
+            report(format_row(result))
+            if result.get('skipped'):
+                return
+            if 'error' in result:
+                METRICS.inc('certificate_failures_total')
+                METRICS.log("certificate_failed", cert_id=result['cert_id'], error=result['error'])
+            else:
+                METRICS.inc('certificates_issued_total')
+                METRICS.log("certificate_issued", cert_id=result['cert_id'], drive_link=result['drive_link'],
+                            qr_version=result.get('qr_version'), timings=result.get('timings'))
+
+        def publish(batch):
+            # One batched permission request covers every row in the batch
+            timings = {}
+            with timed_stage(timings, 'permission'):
+                errors = self.uploader.grant_public([r['file_id'] for r in batch])
+            for result in batch:
+                result['timings'].update(timings)
+                if errors[result['file_id']] is not None:
+                    result['error'] = f"permission failed: {errors[result['file_id']]}"
+            self._journal_errors(batch)
+            if self.journal is not None:
+                self.journal.advance([r['cert_id'] for r in batch if 'error' not in r], PUBLIC)
+            registry = self.cert_manager.registry
+            if registry is not None:
+                registry.record_many(
+                    (r['certificate_data'], r['file_id'], r['drive_link'], r['pdf_path'], r['qr_data'])
+                    for r in batch if 'error' not in r
+                )
+            for result in batch:
+                finish(result)
+
+        def collect(wait=False):
+            for entry in list(in_flight):
+                result, future = entry
+                if not (wait or future.done()):
+                    continue
+                in_flight.remove(entry)
+                try:
+                    future.result()
+                except Exception as e:
+                    result['error'] = f"upload failed: {e}"
+                    self._journal_errors([result])
+                    finish(result)
+                    continue
+                uploaded.append(result)
+            while len(uploaded) >= PERMISSION_BATCH_SIZE or (wait and uploaded):
+                publish(uploaded[:PERMISSION_BATCH_SIZE])
+                del uploaded[:PERMISSION_BATCH_SIZE]
+
+        while True:
+            result = upload_queue.get()
+            if result is None:
+                break
+            if 'error' in result or result.get('skipped'):
+                finish(result)
+                continue
+            if result.get('resumed') == UPLOADED:
+                # Already on Drive; only the permission grant is missing
+                uploaded.append(result)
+                collect()
+                continue
+            future = self.uploader.submit_task(self._upload_one, result)
+            in_flight.append((result, future))
+            collect()
+        collect(wait=True)
+
+    def _upload_one(self, result):
+        with timed_stage(result['timings'], 'upload'):
+            self.uploader.upload(
+                result.pop('pdf_bytes'), os.path.basename(result['pdf_path']), result['file_id']
+            )
+        if self.journal is not None:
+            self.journal.advance([result['cert_id']], UPLOADED)
+
+    def _journal_errors(self, results):
+        if self.journal is not None:
+            for result in results:
+                if 'error' in result:
+                    self.journal.fail(result['cert_id'], result['error'])
+
+    def _reserve(self, result, certificate_data, timestamp):
+        """Give a new row its Drive file ID, link, PDF path and QR payload."""
+        cert_id = result['cert_id']
+        file_id = self._next_file_id()
+        drive_link = drive_link_for(file_id)
+        certificate_data['drive_link'] = drive_link
+        pdf_path = certificate_path(cert_id, timestamp, self.output_dir)
+        qr_data = self.cert_manager.qr_data_for(certificate_data, file_id)
+        result.update(file_id=file_id, drive_link=drive_link, pdf_path=pdf_path,
+                      certificate_data=certificate_data, qr_data=qr_data)
+        if self.journal is not None:
+            # Written ahead, so a re-run reuses this file ID
+            self.journal.reserve(cert_id, certificate_data, file_id, drive_link, pdf_path, qr_data)
+
+    def _resume(self, result, certificate_data, entry):
+        """Pick a row up from its journal entry; return True if it still needs rendering."""
+        result.update(file_id=entry['file_id'], drive_link=entry['drive_link'], pdf_path=entry['pdf_path'],
+                      qr_data=entry['qr_data'], certificate_data=certificate_data, timings={})
+        certificate_data['drive_link'] = entry['drive_link']
+        if entry['stage'] == PUBLIC:
+            result['skipped'] = True
+            return False
+        result['resumed'] = entry['stage']
+        if entry['stage'] == UPLOADED:
+            return False
+        if entry['stage'] == RENDERED and os.path.exists(entry['pdf_path']):
+            with open(entry['pdf_path'], "rb") as f:
+                result['pdf_bytes'] = f.read()
+            return False
+        return True
+
+    def run(self, rows, report=print):
+        """Issue a certificate for every row and return a summary dict."""
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Every row of a run shares the timestamp, and so the day directory
+        os.makedirs(os.path.dirname(certificate_path("", timestamp, self.output_dir)), exist_ok=True)
+        upload_queue = queue.Queue(maxsize=self.queue_size)
+        results = []
+        uploader = threading.Thread(
+            target=self._upload_worker, args=(upload_queue, results, report), daemon=True
+        )
+        uploader.start()
+
+        start = time.perf_counter()
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for row_number, certificate_data in enumerate(rows, start=1):
+                cert_id = certificate_data.get('Certificate ID') or f"row{row_number}"
+                result = {'row': row_number, 'cert_id': cert_id}
+                entry = self.journal.get(cert_id, certificate_data) if self.journal is not None else None
+                future = None
+                try:
+                    if entry is not None:
+                        needs_render = self._resume(result, certificate_data, entry)
+                    else:
+                        self._reserve(result, certificate_data, timestamp)
+                        needs_render = True
+                    if needs_render:
+                        future = executor.submit(render_job, certificate_data, result['qr_data'],
+                                                 result['pdf_path'], self.cert_manager.pdf_profile)
+                except Exception as e:
+                    result['error'] = f"reserve failed: {e}"
+                pending.append((result, future))
+
+                # Keep only a bounded number of renders in flight
+                while len(pending) > self.queue_size:
+                    self._collect(pending.popleft(), upload_queue)
+
+            while pending:
+                self._collect(pending.popleft(), upload_queue)
+
+        upload_queue.put(None)
+        uploader.join()
+        elapsed = time.perf_counter() - start
+
+        failed = sum(1 for r in results if 'error' in r)
+        skipped = sum(1 for r in results if r.get('skipped'))
+        resumed = sum(1 for r in results if r.get('resumed') and 'error' not in r)
+        summary = {
+            'total': len(results),
+            'succeeded': len(results) - failed - skipped,
+            'failed': failed,
+            'skipped': skipped,
+            'resumed': resumed,
+            'elapsed': elapsed,
+            'per_second': len(results) / elapsed if elapsed else 0.0,
+            'results': results
+        }
+        done = f", {skipped} already issued, {resumed} resumed" if self.journal is not None else ""
+        report(
+            f"Issued {summary['succeeded']}/{summary['total']} certificates "
+            f"({failed} failed{done}) in {elapsed:.1f}s, {summary['per_second']:.2f} certificates/sec"
+        )
+        return summary
+
+    def _collect(self, entry, upload_queue):
+        result, future = entry
+        if future is not None:
+            try:
+                result['pdf_bytes'], result['timings'], result['qr_version'] = future.result()
+            except Exception as e:
+                result['error'] = f"render failed: {e}"
+                self._journal_errors([result])
+            else:
+                if self.journal is not None:
+                    self.journal.advance([result['cert_id']], RENDERED)
+                # Stages timed in the worker process are recorded here
+                for stage, seconds in result['timings'].items():
+                    METRICS.observe('stage_seconds', seconds, stage=stage)
+                METRICS.inc('bytes_written_total', len(result['pdf_bytes']), destination="disk")
+        upload_queue.put(result)
+
+
+def format_row(result):
+    """Format the outcome of one roster row for the batch report."""
+    if 'error' in result:
+        return f"row {result['row']} [{result['cert_id']}]: FAILED - {result['error']}"
+    if result.get('skipped'):
+        return f"row {result['row']} [{result['cert_id']}]: SKIPPED {result['drive_link']} (already issued)"
+    if 'qr_version' not in result:
+        # Resumed after rendering; the render timings are from the earlier run
+        return (f"row {result['row']} [{result['cert_id']}]: OK {result['drive_link']} "
+                f"(resumed from {result['resumed']})")
+    timings = " ".join(f"{k}={v * 1000:.0f}ms" for k, v in result['timings'].items())
+    resumed = f", resumed from {result['resumed']}" if result.get('resumed') else ""
+    return (f"row {result['row']} [{result['cert_id']}]: OK {result['drive_link']} "
+            f"(QR v{result['qr_version']}{resumed}, {timings})")
@@ -0,0 +1,89 @@
+"""Bytes per certificate and Drive upload time for each PDF output profile.
+
+    python benchmarks/bench_pdf_size.py --records 200 --uplink 125000
+
+Renders the same roster in every profile of certificate_template and
+uploads each PDF to fake_drive.py throttled to --uplink bytes/sec (the
+default, 1 Mbit/s, is a typical clinic line). "legacy" is the output
+before profiles existed, so it is the baseline. "archival" is included
+when Ghostscript is installed.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.auth.credentials import AnonymousCredentials
+
+import fake_drive
+from bench_template import sample_roster
+from certificate_manager import CertificateManager, render_qr
+from certificate_template import PDF_PROFILES, find_ghostscript, template_for
+from drive_client import build_drive_service
+
+BASELINE = "legacy"
+
+
+def render_all(profile, roster, qrs):
+    """Return the PDF bytes of every certificate and the median render time in seconds."""
+    template = template_for(profile)
+    pdfs = []
+    samples = []
+    for record, qr in zip(roster, qrs):
+        start = time.perf_counter()
+        pdfs.append(CertificateManager.render_certificate(record, qr, template))
+        samples.append(time.perf_counter() - start)
+    return pdfs, statistics.median(samples)
+
+
+def upload_all(manager, pdfs, uploads):
+    """Return the median time to upload the first `uploads` PDFs, one at a time."""
+    samples = []
+    for i, pdf_bytes in enumerate(pdfs[:uploads]):
+        start = time.perf_counter()
+        manager.create_drive_file(pdf_bytes, f"Vaccine_Certificate_{i}.pdf")
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=200)
+    parser.add_argument("--uploads", type=int, default=20, help="Certificates uploaded per profile")
+    parser.add_argument("--uplink", type=float, default=125000, help="Upload bandwidth in bytes/sec")
+    args = parser.parse_args()
+
+    roster = sample_roster(args.records)
+    qrs = [render_qr(f"https://drive.google.com/file/d/{i:028d}/view") for i in range(args.records)]
+    profiles = [BASELINE] + [p for p in PDF_PROFILES if p != BASELINE]
+    if find_ghostscript() is None:
+        profiles.remove("archival")
+        print("Ghostscript not found; skipping the archival profile", file=sys.stderr)
+
+    server, drive = fake_drive.serve(uplink=args.uplink)
+    try:
+        manager = CertificateManager("", "benchmark-folder", drive_service=build_drive_service(
+            AnonymousCredentials(), f"http://127.0.0.1:{server.server_port}"))
+        # The first request pays for building the Drive client
+        manager.create_drive_file(b"%PDF-1.3", "warm-up.pdf")
+        rows = []
+        for profile in profiles:
+            pdfs, render = render_all(profile, roster, qrs)
+            upload = upload_all(manager, pdfs, args.uploads)
+            rows.append((profile, statistics.mean(map(len, pdfs)), render, upload))
+    finally:
+        server.shutdown()
+
+    print(f"records: {args.records}, uplink: {args.uplink / 1000:.0f} KB/s")
+    print(f"{'profile':<10}{'bytes/cert':>12}{'render ms':>11}{'upload ms':>11}{'MB/1000 certs':>15}")
+    base_bytes, base_upload = rows[0][1], rows[0][3]
+    for profile, size, render, upload in rows:
+        change = "" if profile == BASELINE else f"  ({size / base_bytes - 1:+.0%} bytes, {upload / base_upload - 1:+.0%} upload)"
+        print(f"{profile:<10}{size:>12.0f}{render * 1000:>11.2f}{upload * 1000:>11.1f}{size * 1000 / 1e6:>15.2f}{change}")
+
+
+if __name__ == "__main__":
+    main()
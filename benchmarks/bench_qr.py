@@ -0,0 +1,100 @@
+"""Compare QR rendering through PIL with the NumPy module raster.
+
+    python benchmarks/bench_qr.py --codes 500
+
+"before" is the old path: qrcode's make_image, a PNG written and read
+back, a LANCZOS resize for the GUI preview and the image embedded in the
+PDF. "after" rasterizes the module matrix with NumPy, renders the
+preview at its display size and draws the code into the PDF as vector
+shapes. The module matrices are built up front for both, so only the
+rendering is measured.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+
+from bench_template import sample_roster
+from certificate_manager import build_qr
+from certificate_template import DEFAULT_TEMPLATE
+from qr_render import QRRaster
+
+PREVIEW_SIZE = 250
+
+
+def old_image(qr):
+    return qr.make_image(fill_color="black", back_color="white").get_image()
+
+
+def old_preview(qr):
+    buffer = io.BytesIO()
+    old_image(qr).save(buffer, format="PNG")
+    buffer.seek(0)
+    return Image.open(buffer).resize((PREVIEW_SIZE, PREVIEW_SIZE), Image.Resampling.LANCZOS)
+
+
+def old_pdf(record, qr):
+    buffer = io.BytesIO()
+    DEFAULT_TEMPLATE.render(record, ImageReader(old_image(qr)), buffer)
+    return buffer.getvalue()
+
+
+def new_image(qr):
+    return QRRaster.from_qr(qr).image()
+
+
+def new_preview(qr):
+    return QRRaster.from_qr(qr).preview(PREVIEW_SIZE)
+
+
+def new_pdf(record, qr):
+    buffer = io.BytesIO()
+    DEFAULT_TEMPLATE.render(record, QRRaster.from_qr(qr), buffer)
+    return buffer.getvalue()
+
+
+def per_call_ms(fn, items):
+    """Median milliseconds per call of fn over items."""
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(*item)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--codes", type=int, default=500, help="Distinct QR codes to render")
+    args = parser.parse_args()
+
+    roster = sample_roster(args.codes)
+    qrs = [build_qr(f"https://drive.google.com/file/d/{i:028d}/view") for i in range(args.codes)]
+    pdf_items = list(zip(roster, qrs))
+    # Warm up both paths, including ReportLab's font setup
+    old_pdf(*pdf_items[0])
+    new_pdf(*pdf_items[0])
+
+    print(f"codes: {args.codes} (version {qrs[0].version}, {QRRaster.from_qr(qrs[0]).width} modules)")
+    print(f"{'':<22}{'before':>10}{'after':>10}")
+    for name, old, new, items in [
+        ("image (ms)", old_image, new_image, [(qr,) for qr in qrs]),
+        (f"preview {PREVIEW_SIZE}px (ms)", old_preview, new_preview, [(qr,) for qr in qrs]),
+        ("certificate PDF (ms)", old_pdf, new_pdf, pdf_items),
+    ]:
+        before, after = per_call_ms(old, items), per_call_ms(new, items)
+        print(f"{name:<22}{before:>10.2f}{after:>10.2f}  ({before / after:.1f}x)")
+    before = statistics.mean(len(old_pdf(*item)) for item in pdf_items[:50])
+    after = statistics.mean(len(new_pdf(*item)) for item in pdf_items[:50])
+    print(f"{'PDF size (bytes)':<22}{before:>10.0f}{after:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
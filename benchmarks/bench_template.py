@@ -0,0 +1,89 @@
+"""Compare certificate rendering with and without the precompiled template.
+
+    python benchmarks/bench_template.py --records 1000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from certificate_manager import CertificateManager
+from certificate_template import CertificateTemplate
+
+
+def sample_roster(count):
+    """Return count synthetic certificate records."""
+    return [
+        {
+            'Full Name': f"Pilgrim {i}",
+            'Age': str(20 + i % 60),
+            'Gender': "Male" if i % 2 else "Female",
+            'Certificate ID': f"CERT{i:06d}",
+            'Mobile': f"01700{i:06d}",
+            'Passport': f"A{i:08d}",
+            'NID': f"{1990000000 + i}",
+            'Address': f"House {i}, Road {i % 40}, Dhaka",
+            'Nationality': "Bangladesh",
+            'Referred By': "Dr. Rahman",
+            'Facility': "Central Vaccination Centre",
+            'Mode': "Hajj",
+            'Vaccine Name': "Quadrivalent Neisseria Meningitis Meningococal",
+            'Date': "2025-02-06",
+            'Mfg Date': "2024-06-01",
+            'Exp Date': "2026-06-01",
+            'Dose Information': "1",
+            'Batch': f"B{i % 97:03d}",
+            'Manufacturer': "Sanofi",
+        }
+        for i in range(count)
+    ]
+
+
+def bench_files(template, roster, qr_images):
+    """One single-page document per certificate."""
+    start = time.perf_counter()
+    for record, qr_image in zip(roster, qr_images):
+        template.render(record, qr_image, io.BytesIO())
+    return len(roster) / (time.perf_counter() - start)
+
+
+def bench_document(template, roster, qr_images):
+    """All certificates as pages of one document sharing the static form."""
+    start = time.perf_counter()
+    c = canvas.Canvas(io.BytesIO(), pagesize=template.pagesize)
+    for record, qr_image in zip(roster, qr_images):
+        template.stamp(c, record, qr_image)
+        c.showPage()
+    c.save()
+    return len(roster) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=1000)
+    args = parser.parse_args()
+
+    roster = sample_roster(args.records)
+    # QR codes are built up front so only the page rendering is measured
+    qr_images = [
+        ImageReader(CertificateManager.generate_qr_image(f"https://drive.google.com/file/d/{i:028d}/view"))
+        for i in range(len(roster))
+    ]
+
+    before = bench_files(CertificateTemplate(precompiled=False), roster, qr_images)
+    after = bench_files(CertificateTemplate(), roster, qr_images)
+    shared = bench_document(CertificateTemplate(), roster, qr_images)
+    print(f"records:                   {args.records}")
+    print(f"before:                    {before:.1f} certificates/sec")
+    print(f"precompiled, one file:     {after:.1f} certificates/sec ({after / before:.2f}x)")
+    print(f"precompiled, one document: {shared:.1f} certificates/sec ({shared / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Load test for verify_server.py: requests/sec and latency percentiles.
+
+    python benchmarks/load_verify.py --records 100000 --concurrency 64 --duration 10
+
+Builds a temporary registry of --records certificates, starts the
+verification service on it in a separate process and has --concurrency
+keep-alive clients send a mix of signed compact payloads, Drive links
+and Certificate IDs (about 5% of them unknown). With --url an already
+running service is tested instead, using the certificates in --registry
+(a copy of the service's registry; default: the same sample roster).
+Compact payloads are only sent to it when its --signing-key is given,
+since payloads signed with any other key would not verify.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_template import sample_roster
+from drive_uploader import drive_link_for
+from qr_payload import encode_payload
+from registry import CertificateRegistry
+from verifier import load_or_create_signing_key, load_signing_key
+
+
+def file_id_for(i):
+    return f"{i:028d}"
+
+
+def build_registry(path, records):
+    """Fill a registry with the sample roster; return its (record, Drive file ID) pairs."""
+    registry = CertificateRegistry(path)
+    entries = [(record, file_id_for(i)) for i, record in enumerate(sample_roster(records))]
+    registry.record_many((record, file_id, drive_link_for(file_id), None, None) for record, file_id in entries)
+    registry.close()
+    return entries
+
+
+def read_registry(path):
+    """Return the (record, Drive file ID) pairs of an existing registry's uploaded certificates."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Registry not found at {path}")
+    registry = CertificateRegistry(path)
+    try:
+        rows = registry.changes_since()
+    finally:
+        registry.close()
+    return [(json.loads(row['data']), row['drive_file_id']) for row in rows if row['drive_file_id']]
+
+
+def build_queries(entries, signing_key=None):
+    """Return the queries to send; compact payloads are included only with a signing key."""
+    queries = []
+    for record, file_id in entries[:5000]:
+        if signing_key is not None:
+            queries.append("qr=" + quote(encode_payload(record, file_id, signing_key=signing_key)))
+        queries.append("qr=" + quote(drive_link_for(file_id)))
+        queries.append("id=" + quote(record['Certificate ID']))
+    unknown = [f"id=UNKNOWN{i}" for i in range(len(queries) // 20)]
+    return queries + unknown
+
+
+def wait_until_up(url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url + "/health", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"verification service at {url} did not come up")
+
+
+async def client(host, port, queries, deadline, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            query = random.choice(queries)
+            start = time.perf_counter()
+            writer.write(f"GET /verify?{query} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+            await writer.drain()
+            length = 0
+            status = await reader.readline()
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            if not status.startswith(b"HTTP/1.1 200"):
+                raise RuntimeError(f"unexpected response {status!r}")
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def load(url, queries, concurrency, duration):
+    parts = url.split("//", 1)[1].split(":")
+    host, port = parts[0], int(parts[1])
+    latencies = []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(client(host, port, queries, deadline, latencies) for _ in range(concurrency)))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Test a running service, e.g. http://127.0.0.1:8780")
+    parser.add_argument("--registry", help="With --url: a copy of the service's registry to take certificates from")
+    parser.add_argument("--signing-key", help="With --url: the service's signing key, to send compact payloads")
+    parser.add_argument("--records", type=int, default=100000, help="Certificates in the test registry")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to send requests for")
+    parser.add_argument("--port", type=int, default=8799)
+    args = parser.parse_args()
+    if args.url is None and (args.registry or args.signing_key):
+        parser.error("--registry and --signing-key are only used with --url")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        server = None
+        url = args.url
+        key_path = os.path.join(tmp_dir, "signing.key")
+        if url is not None:
+            signing_key = load_signing_key(args.signing_key) if args.signing_key else None
+            if args.registry:
+                entries = read_registry(args.registry)
+            else:
+                entries = [(record, file_id_for(i)) for i, record in enumerate(sample_roster(min(args.records, 5000)))]
+            queries = build_queries(entries, signing_key)
+        else:
+            start = time.perf_counter()
+            signing_key = load_or_create_signing_key(key_path)
+            queries = build_queries(build_registry(os.path.join(tmp_dir, "registry.db"), args.records), signing_key)
+            print(f"Built a registry of {args.records} certificates in {time.perf_counter() - start:.1f}s",
+                  file=sys.stderr)
+            url = f"http://127.0.0.1:{args.port}"
+            server = subprocess.Popen([sys.executable, os.path.join(ROOT, "verify_server.py"),
+                                       "--port", str(args.port), "--registry", os.path.join(tmp_dir, "registry.db"),
+                                       "--signing-key", key_path])
+        try:
+            wait_until_up(url)
+            latencies = asyncio.run(load(url, queries, args.concurrency, args.duration))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    ordered = sorted(latencies)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+    print(f"{len(ordered)} requests in {args.duration:.0f}s with {args.concurrency} connections: "
+          f"{len(ordered) / args.duration:.0f} requests/sec")
+    print(f"latency ms: p50 {pick(0.50):.2f}  p90 {pick(0.90):.2f}  p99 {pick(0.99):.2f}  "
+          f"max {ordered[-1] * 1000:.2f}  mean {statistics.fmean(ordered) * 1000:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
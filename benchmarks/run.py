@@ -0,0 +1,232 @@
+"""Benchmark suite for the issuance and scanning hot paths.
+
+Writes machine-readable JSON so runs can be compared across commits:
+
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --output after.json --compare before.json
+
+With --compare, any benchmark whose median got slower by more than
+--threshold (default 10%) is reported and the exit status is 1.
+Drive calls go to fake_drive.py, so no network or credentials are
+needed. The decode benchmarks are skipped if pyzbar cannot load zbar.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from google.auth.credentials import AnonymousCredentials
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+import fake_drive
+from bench_template import sample_roster
+from certificate_manager import CertificateManager, build_qr
+from certificate_template import DEFAULT_TEMPLATE
+from drive_client import build_drive_service
+from qr_payload import encode_payload
+
+QR_PAYLOAD_SIZES = [32, 128, 512, 1024]
+DECODE_WIDTHS = [150, 300, 600]
+
+
+def measure(fn, iterations, warmup=2):
+    """Call fn(i) repeatedly and return the per-call durations in seconds."""
+    for i in range(warmup):
+        fn(-1 - i)
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples, **extra):
+    """Reduce per-call durations to the statistics stored in the JSON report."""
+    ordered = sorted(samples)
+    result = {
+        'iterations': len(samples),
+        'median_ms': statistics.median(ordered) * 1000,
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'min_ms': ordered[0] * 1000,
+        'ops_per_sec': len(samples) / sum(samples),
+    }
+    result.update(extra)
+    return result
+
+
+def payload(size, i):
+    # Distinct payloads, so the QR matrix cache does not hide the work
+    prefix = f"{i}:"
+    return prefix + "x" * max(0, size - len(prefix))
+
+
+def bench_qr(iterations, tmp_dir):
+    results = {}
+    path = os.path.join(tmp_dir, "qr.png")
+    for size in QR_PAYLOAD_SIZES:
+        samples = measure(lambda i: CertificateManager.generate_qr_code(payload(size, i), path), iterations)
+        results[f"qr_code[{size}B]"] = summarize(samples, qr_version=build_qr(payload(size, 0)).version)
+    return results
+
+
+def bench_pdf(iterations, roster, qr_images):
+    results = {}
+    samples = measure(lambda i: CertificateManager.generate_pdf_certificate(
+        roster[i % len(roster)], qr_images[i % len(qr_images)], io.BytesIO()), iterations)
+    results["pdf_single"] = summarize(samples)
+
+    def bulk(_):
+        c = canvas.Canvas(io.BytesIO(), pagesize=DEFAULT_TEMPLATE.pagesize)
+        for record, qr_image in zip(roster, qr_images):
+            DEFAULT_TEMPLATE.stamp(c, record, qr_image)
+            c.showPage()
+        c.save()
+    samples = measure(bulk, max(3, iterations // 20), warmup=1)
+    results[f"pdf_bulk[{len(roster)}]"] = summarize(
+        samples, certificates_per_sec=len(roster) * len(samples) / sum(samples))
+    return results
+
+
+def bench_process(iterations, roster, latency):
+    server, drive = fake_drive.serve(latency=latency)
+    try:
+        endpoint = f"http://127.0.0.1:{server.server_port}"
+        manager = CertificateManager("", "benchmark-folder",
+                                     drive_service=build_drive_service(AnonymousCredentials(), endpoint))
+        samples = measure(lambda i: manager.process_certificate(dict(roster[i % len(roster)]), save_local=False),
+                          iterations)
+    finally:
+        server.shutdown()
+    return {"process_certificate": summarize(samples, drive_latency_ms=latency * 1000)}
+
+
+def decode_corpus(roster):
+    """Render QR codes for the roster, as link and compact payloads."""
+    corpus = []
+    for i, record in enumerate(roster):
+        file_id = f"{i:028d}"
+        for qr_data in (f"https://drive.google.com/file/d/{file_id}/view", encode_payload(record, file_id)):
+            corpus.append((qr_data, CertificateManager.generate_qr_image(qr_data).convert("L")))
+    return corpus
+
+
+def bench_decode(iterations, roster):
+    try:
+        from pyzbar.pyzbar import decode
+    except ImportError as e:
+        return {"decode": {"skipped": str(e)}}
+    import numpy as np
+    corpus = decode_corpus(roster[:10])
+    results = {}
+    for width in DECODE_WIDTHS:
+        frames = [(qr_data, np.asarray(image.resize((width, width), Image.Resampling.NEAREST)))
+                  for qr_data, image in corpus]
+        decoded = []
+
+        def run(i):
+            qr_data, frame = frames[i % len(frames)]
+            found = decode(frame)
+            if i >= 0:
+                decoded.append(any(b.data.decode("utf-8") == qr_data for b in found))
+        samples = measure(run, iterations)
+        results[f"decode[{width}px]"] = summarize(samples, success_rate=sum(decoded) / len(decoded))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print per-benchmark changes against a baseline; return the regressions."""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old or 'median_ms' not in old or 'median_ms' not in result:
+            continue
+        change = result['median_ms'] / old['median_ms'] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<28}{old['median_ms']:10.3f} ms -> {result['median_ms']:10.3f} ms  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--records", type=int, default=50, help="Certificates per bulk render")
+    parser.add_argument("--drive-latency", type=float, default=0.0,
+                        help="Seconds the fake Drive adds to every call")
+    parser.add_argument("--only", help="Run only benchmark groups whose name contains this")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative median slowdown counted as a regression")
+    args = parser.parse_args()
+
+    roster = sample_roster(args.records)
+    qr_images = [ImageReader(CertificateManager.generate_qr_image(f"https://drive.google.com/file/d/{i:028d}/view"))
+                 for i in range(len(roster))]
+    groups = {
+        "qr": lambda tmp_dir: bench_qr(args.iterations, tmp_dir),
+        "pdf": lambda tmp_dir: bench_pdf(args.iterations, roster, qr_images),
+        "process": lambda tmp_dir: bench_process(args.iterations, roster, args.drive_latency),
+        "decode": lambda tmp_dir: bench_decode(args.iterations, roster),
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, run in groups.items():
+            if args.only and args.only not in name:
+                continue
+            print(f"running {name}...", file=sys.stderr)
+            results.update(run(tmp_dir))
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'time': datetime.datetime.now().isoformat(timespec="seconds"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'records': args.records,
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,247 @@
+"""Offline audit of a folder of certificate images and PDFs.
+
+    python bulk_verify.py scans/ --output audit.csv --verify certificates/signing.key
+
+Every image (phone photos, scans) and PDF below the given directories is
+decoded in a process pool, one row per QR code found (or per file with
+none) streamed to a CSV or JSON Lines file as results come in. PDF pages
+are rasterized with pypdfium2 or PyMuPDF if either is installed;
+otherwise only the images embedded in each page are extracted with pypdf.
+That covers scanned PDFs but not certificates issued by this app, whose
+QR code is drawn as vector shapes, so a PDF page without a QR image is
+reported as an error ("no rasterizer available") rather than as no QR.
+
+Each image goes through a preprocessing ladder and stops at the first
+rung that finds a QR code: downscaled grayscale (as the live scanner
+uses), the same with an Otsu threshold, then full resolution, then full
+resolution with an adaptive threshold. Most files decode on the first,
+cheapest rung; the full-resolution passes are paid only for the hard
+ones. With --verify, every payload is also checked against the registry.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+PDF_DPI = 150
+# Width of the first, downscaled rung; phone photos are often 4000px wide
+FAST_WIDTH = 1000
+FIELDS = ["path", "page", "outcome", "rung", "payload", "status", "cert_id", "reason", "elapsed_ms"]
+
+
+def find_files(paths):
+    """Yield the image and PDF files given, or found below the directories given."""
+    from retention import walk_files
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for entry in walk_files(path):
+            if entry.name.lower().endswith(IMAGE_SUFFIXES + (".pdf",)):
+                yield entry.path
+
+
+def _pdf_pages_pdfium(path):
+    import pypdfium2
+    document = pypdfium2.PdfDocument(path)
+    try:
+        for number, page in enumerate(document, start=1):
+            yield number, page.render(scale=PDF_DPI / 72, grayscale=True).to_numpy()
+    finally:
+        document.close()
+
+
+def _pdf_pages_fitz(path):
+    import fitz
+    import numpy as np
+    with fitz.open(path) as document:
+        for number, page in enumerate(document, start=1):
+            pixmap = page.get_pixmap(dpi=PDF_DPI, colorspace=fitz.csGRAY)
+            yield number, np.frombuffer(pixmap.samples, np.uint8).reshape(pixmap.height, pixmap.width)
+
+
+def _pdf_pages_embedded(path):
+    import numpy as np
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ImportError("Reading PDFs needs pypdfium2, PyMuPDF or pypdf (pip install pypdfium2)") from None
+    for number, page in enumerate(PdfReader(path).pages, start=1):
+        for image in page.images:
+            yield number, np.asarray(image.image.convert("L"))
+
+
+PDF_RASTERIZERS = (("pypdfium2", _pdf_pages_pdfium), ("fitz", _pdf_pages_fitz))
+NO_RASTERIZER = "no rasterizer available (pip install pypdfium2); no QR image embedded in the page"
+
+
+def pdf_rasterizer():
+    """Return the page reader of the first installed rasterizer, or None."""
+    for module, reader in PDF_RASTERIZERS:
+        try:
+            __import__(module)
+        except ImportError:
+            continue
+        return reader
+    return None
+
+
+def pdf_pages(path):
+    """Yield (page number, grayscale array) for the pages of a PDF."""
+    reader = pdf_rasterizer()
+    return reader(path) if reader is not None else _pdf_pages_embedded(path)
+
+
+def ladder(image):
+    """Yield (rung name, image) from the cheapest preprocessing to the most thorough."""
+    import cv2
+    from scanner import preprocess_frame
+    small = preprocess_frame(image, FAST_WIDTH)
+    yield "gray", small
+    yield "otsu", cv2.threshold(small, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    if small.shape != image.shape[:2]:
+        full = preprocess_frame(image, None)
+        yield "full", full
+        yield "adaptive", cv2.adaptiveThreshold(full, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                                cv2.THRESH_BINARY, 51, 10)
+
+
+def decode_image(image):
+    """Return (rung, payloads) for the first ladder rung that finds a QR code."""
+    from pyzbar.pyzbar import ZBarSymbol, decode
+    for rung, candidate in ladder(image):
+        barcodes = decode(candidate, symbols=[ZBarSymbol.QRCODE])
+        if barcodes:
+            return rung, [barcode.data.decode("utf-8", errors="replace") for barcode in barcodes]
+    return None, []
+
+
+def scan_file(path):
+    """Decode every QR code in an image or PDF; runs in a worker process."""
+    rows = []
+    start = time.perf_counter()
+    # Without a rasterizer a vector QR code is invisible, so "no QR" would be a guess
+    missing = {'outcome': "no_qr"}
+    try:
+        if path.lower().endswith(".pdf"):
+            if pdf_rasterizer() is None:
+                missing = {'outcome': "error", 'reason': NO_RASTERIZER}
+            pages = pdf_pages(path)
+        else:
+            import cv2
+            image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                raise ValueError("unreadable image")
+            pages = [(None, image)]
+        # A page without rasterization may come as several embedded images
+        found = {}
+        for page, image in pages:
+            rung, payloads = decode_image(image)
+            page_rung, page_payloads = found.setdefault(page, (rung, []))
+            if payloads and page_rung is None:
+                found[page] = (rung, page_payloads)
+            page_payloads.extend(payloads)
+        for page, (rung, payloads) in found.items():
+            for payload in payloads or [None]:
+                outcome = {'outcome': "decoded"} if payload else missing
+                rows.append({'path': path, 'page': page, 'rung': rung, 'payload': payload, **outcome})
+        if not rows:
+            rows.append({'path': path, 'page': None, 'rung': None, 'payload': None, **missing})
+    except Exception as e:
+        rows = [{'path': path, 'page': None, 'outcome': "error", 'rung': None, 'payload': None,
+                 'reason': f"{type(e).__name__}: {e}"}]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for row in rows:
+        row['elapsed_ms'] = round(elapsed_ms, 1)
+    return rows
+
+
+class ResultWriter:
+    """Stream result rows to a CSV or JSON Lines file (chosen by extension), or stdout."""
+
+    def __init__(self, path=None):
+        self._file = open(path, "w", newline="", encoding="utf-8") if path else sys.stdout
+        self._csv = None
+        if path and path.lower().endswith(".csv"):
+            self._csv = csv.DictWriter(self._file, FIELDS, extrasaction="ignore")
+            self._csv.writeheader()
+
+    def write(self, row):
+        if self._csv is not None:
+            self._csv.writerow(row)
+        else:
+            self._file.write(json.dumps({field: row.get(field) for field in FIELDS}) + "\n")
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+def run(paths, writer, workers=None, verifier=None, report=None):
+    """Scan all files with a process pool, writing rows as they finish; returns a summary dict."""
+    workers = workers or os.cpu_count() or 1
+    summary = {'files': 0, 'decoded': 0, 'no_qr': 0, 'error': 0, 'rungs': {}, 'statuses': {}}
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        # Small chunks keep the workers evenly loaded when file sizes vary
+        for rows in pool.imap_unordered(scan_file, find_files(paths), chunksize=8):
+            summary['files'] += 1
+            outcomes = {row['outcome'] for row in rows}
+            outcome = "decoded" if "decoded" in outcomes else outcomes.pop()
+            summary[outcome] += 1
+            for row in rows:
+                if row['rung']:
+                    summary['rungs'][row['rung']] = summary['rungs'].get(row['rung'], 0) + 1
+                if verifier is not None and row['payload']:
+                    result = verifier.verify(row['payload'])
+                    row.update(status=result.status, cert_id=result.cert_id, reason=result.reason)
+                    summary['statuses'][result.status] = summary['statuses'].get(result.status, 0) + 1
+                writer.write(row)
+            if report is not None and summary['files'] % 500 == 0:
+                report(format_summary(summary, time.perf_counter() - start))
+    summary['elapsed'] = time.perf_counter() - start
+    return summary
+
+
+def format_summary(summary, elapsed):
+    rate = summary['files'] / elapsed if elapsed else 0.0
+    text = (f"{summary['files']} files in {elapsed:.1f}s ({rate:.1f} files/sec): "
+            f"{summary['decoded']} decoded, {summary['no_qr']} without a QR code, {summary['error']} errors")
+    if summary['rungs']:
+        text += " | rungs " + " ".join(f"{rung}={count}" for rung, count in summary['rungs'].items())
+    if summary['statuses']:
+        text += " | " + " ".join(f"{status}={count}" for status, count in summary['statuses'].items())
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode and verify QR codes in a folder of images and PDFs")
+    parser.add_argument("paths", nargs="+", help="Directories or files to scan")
+    parser.add_argument("--output", help="Write results to this .csv or .jsonl file (default: JSON Lines on stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="Decode processes (default: number of cores)")
+    parser.add_argument("--verify", metavar="KEY_FILE",
+                        help="Check each payload against the registry using this signing key")
+    parser.add_argument("--registry", default="certificates/registry.db")
+    args = parser.parse_args()
+
+    verifier = None
+    if args.verify:
+        from registry import CertificateRegistry
+        from verifier import Verifier, load_signing_key
+        verifier = Verifier(CertificateRegistry(args.registry), load_signing_key(args.verify))
+    writer = ResultWriter(args.output)
+    report = lambda text: print(text, file=sys.stderr)
+    try:
+        summary = run(args.paths, writer, args.workers, verifier, report)
+    finally:
+        writer.close()
+    report(format_summary(summary, summary['elapsed']))
+    return 1 if summary['error'] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
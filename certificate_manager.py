@@ -1,223 +1,452 @@
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-import qrcode
-import json
-import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-import os
-import textwrap
-class CertificateManager:
-    def __init__(self, credentials_path, folder_id):
-        self.SCOPES = ["https://www.googleapis.com/auth/drive.file"]
-        self.folder_id = folder_id
-        self.credentials = service_account.Credentials.from_service_account_file(
-            credentials_path, scopes=self.SCOPES
-        )
-        self.drive_service = build("drive", "v3", credentials=self.credentials)
-
-    def generate_pdf_certificate(self, certificate_data, qr_image_path, pdf_filename):
-        """Generate a PDF certificate with a layout matching the provided format."""
-        c = canvas.Canvas(pdf_filename, pagesize=A4)
-        width, height = A4
-
-        # Helper function for drawing lines
-        def draw_line(y_position):
-            c.line(50, y_position, width-50, y_position)
-
-        # Set up default font
-        c.setFont("Helvetica-Bold", 16)
-        
-        # Header - Print Report
-        c.drawString(50, height-50, "Print Report")
-        draw_line(height-60)
-        
-        # Patient Information Section
-        c.setFont("Helvetica", 12)
-        y = height-90
-        
-        # First row
-        c.drawString(50, y, f"Patient Name: {certificate_data.get('Full Name', '')}")
-        c.drawString(400, y, f"Age: {certificate_data.get('Age', '')}Y")
-        
-        # Second row
-        y -= 25
-        c.drawString(50, y, f"Invoice No: {certificate_data.get('Certificate ID', '')}")
-        c.drawString(300, y, f"Invoice Date: {certificate_data.get('Date', '')}")
-        c.drawString(500, y, f"Gender: {certificate_data.get('Gender', '')}")
-        
-        # Third row
-        y -= 25
-        c.drawString(50, y, f"Referred By: {certificate_data.get('Referred By', '')}")
-        
-        # Title
-        y -= 40
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(50, y, "Vaccination Certificate of " + certificate_data.get('Vaccine Name', ''))
-        
-        # Additional Information
-        y -= 30
-        c.setFont("Helvetica", 12)
-        c.drawString(50, y, f"Facility: {certificate_data.get('Facility', '')}")
-        c.drawString(300, y, f"Mode: {certificate_data.get('Mode', '')}")
-        
-        y -= 25
-        c.drawString(50, y, f"Case ID: {certificate_data.get('Certificate ID', '')}")
-        c.drawString(300, y, f"Mobile: {certificate_data.get('Mobile', '')}")
-        
-        y -= 25
-        c.drawString(50, y, f"Passport: {certificate_data.get('Passport', '')}")
-        c.drawString(300, y, f"NID No: {certificate_data.get('NID', '')}")
-        
-        y -= 25
-        c.drawString(50, y, f"Address: {certificate_data.get('Address', '')}")
-        
-        # Vaccine Information Table
-        y -= 50
-        c.setFont("Helvetica-Bold", 12)
-        table_headers = ["Name of Vaccine", "Number of Dose", "Given date", "Batch NO", "Exp. Date", "Mfg Date", "Mfg By"]
-        x_positions = [50, 200, 300, 400, 470, 540, 610]
-        
-        # Draw headers
-        for header, x in zip(table_headers, x_positions):
-            c.drawString(x, y, header)
-        
-        # Draw table data
-        y -= 25
-        c.setFont("Helvetica", 10)
-        c.drawString(50, y, certificate_data.get('Vaccine Name', ''))
-        c.drawString(200, y, certificate_data.get('Dose Information', ''))
-        c.drawString(300, y, certificate_data.get('Date', ''))
-        c.drawString(400, y, certificate_data.get('Batch', ''))
-        c.drawString(470, y, certificate_data.get('Exp Date', ''))
-        c.drawString(540, y, certificate_data.get('Mfg Date', ''))
-        c.drawString(610, y, certificate_data.get('Manufacturer', ''))
-        
-        # Draw lines around table
-        draw_line(y+35)  # Top line
-        draw_line(y-5)   # Bottom line
-        
-        # To Whom It May Concern section
-        y -= 50
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(50, y, "To Whom It May Concern")
-        
-        y -= 25
-        c.setFont("Helvetica", 11)
-        concern_text = (
-            f"This is to certify that {certificate_data.get('Full Name', '')}, "
-            f"Date of Birth: {certificate_data.get('DOB', '')}, {certificate_data.get('Nationality', 'Bangladesh')} citizen, "
-            f"Passport No: {certificate_data.get('Passport', '')} has been vaccinated with {certificate_data.get('Vaccine Name', '')}. "
-            "We wish them all the best for their future endeavors."
-        )
-        
-        # Word wrap the concern text
-        text_object = c.beginText(50, y)
-        text_object.setFont("Helvetica", 11)
-        wrapped_text = "\n".join(textwrap.wrap(concern_text, width=90))
-        for line in wrapped_text.split('\n'):
-            text_object.textLine(line)
-        c.drawText(text_object)
-        
-        # Footer text
-        y = 50
-        c.setFont("Helvetica", 8)
-        footer_text = (
-            "This report has been issued electronically. Any party that relies on the result of this report "
-            "should first check its authenticity by contacting the issuing authority. "
-            "The authority is not responsible for any misuse of this report or its contents."
-        )
-        text_object = c.beginText(50, y)
-        wrapped_text = "\n".join(textwrap.wrap(footer_text, width=100))
-        for line in wrapped_text.split('\n'):
-            text_object.textLine(line)
-        c.drawText(text_object)
-        
-        # Add QR code on the right side
-        qr_size = 100
-        c.drawImage(qr_image_path, width-150, 50, width=qr_size, height=qr_size)
-        
-        c.save()
-
-    def upload_to_drive(self, file_path, file_name):
-        """Upload file to Google Drive and return public link."""
-        file_metadata = {
-            "name": file_name,
-            "mimeType": "application/pdf",
-            "parents": [self.folder_id]
-        }
-
-        media = MediaFileUpload(file_path, mimetype="application/pdf")
-        file = self.drive_service.files().create(
-            body=file_metadata, 
-            media_body=media,
-            fields="id"
-        ).execute()
-
-        file_id = file.get("id")
-
-        # Make file public
-        permission = {"role": "reader", "type": "anyone"}
-        self.drive_service.permissions().create(
-            fileId=file_id, 
-            body=permission
-        ).execute()
-
-        return f"https://drive.google.com/file/d/{file_id}/view"
-
-    def generate_qr_code(self, data, output_path):
-        """Generate QR code from data and save to output path."""
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4
-        )
-        qr.add_data(data)
-        qr.make(fit=True)
-        qr_image = qr.make_image(fill_color="black", back_color="white")
-        qr_image.save(output_path)
-        return output_path
-
-    def process_certificate(self, certificate_data):
-        """Process certificate data and generate all necessary files."""
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        cert_id = certificate_data.get('Certificate ID', 'unknown')
-        
-        # Create output directory if it doesn't exist
-        output_dir = "certificates"
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Generate file paths
-        pdf_filename = f"{output_dir}/Vaccine_Certificate_{cert_id}_{timestamp}.pdf"
-        temp_qr_path = f"{output_dir}/temp_qr_{cert_id}_{timestamp}.png"
-        
-        # First generate a temporary QR code with certificate data
-        self.generate_qr_code(json.dumps(certificate_data), temp_qr_path)
-        
-        # Generate the initial PDF
-        self.generate_pdf_certificate(certificate_data, temp_qr_path, pdf_filename)
-        
-        # Upload to Drive
-        drive_link = self.upload_to_drive(pdf_filename, os.path.basename(pdf_filename))
-        
-        # Update certificate data with drive link
-        certificate_data['drive_link'] = drive_link
-        
-        # Generate final QR code with drive link
-        final_qr_path = f"{output_dir}/qr_{cert_id}_{timestamp}.png"
-        self.generate_qr_code(drive_link, final_qr_path)
-        
-        # Generate final PDF with the drive-link QR code
-        final_pdf_path = pdf_filename  # Overwrite the original PDF
-        self.generate_pdf_certificate(certificate_data, final_qr_path, final_pdf_path)
-        
-        # Clean up temporary QR code
-        os.remove(temp_qr_path)
-        
-        return {
-            'pdf_path': final_pdf_path,
-            'qr_path': final_qr_path,
-            'drive_link': drive_link
-        }
\ No newline at end of file
+import datetime
+import functools
+import io
+import os
+import threading
+import time
+from contextlib import contextmanager
+from drive_client import DRIVE_SCOPES
+from metrics import METRICS
+from qr_payload import encode_payload, unpack_payload, verify_signature
+
+# The Google API client, ReportLab and qrcode take a noticeable share of
+# startup time, so they are imported on first use (or by warm_up()).
+
+QR_FORMATS = ("link", "compact")
+# Output profiles, see certificate_template.PDF_PROFILES
+PDF_PROFILES = ("compact", "archival", "legacy")
+QR_CACHE_SIZE = 1024
+
+
+def certificate_path(cert_id, timestamp, output_dir="certificates", sharded=True):
+    """Return the output path of a certificate PDF.
+
+    Unless sharded is False, certificates are filed in one subdirectory
+    per issue day (YYYYMMDD), so no directory grows without bound.
+    """
+    if sharded:
+        output_dir = f"{output_dir}/{timestamp[:8]}"
+    return f"{output_dir}/Vaccine_Certificate_{cert_id}_{timestamp}.pdf"
+
+
+@functools.lru_cache(maxsize=QR_CACHE_SIZE)
+def build_qr(data):
+    """Build the QR matrix for data, reusing it for repeated payloads."""
+    import qrcode
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+@functools.lru_cache(maxsize=QR_CACHE_SIZE)
+def render_qr(data):
+    """Return a qr_render.QRRaster for data, which draws without a PIL round-trip."""
+    from qr_render import QRRaster
+    return QRRaster.from_qr(build_qr(data))
+
+
+@contextmanager
+def timed_stage(timings, stage, on_start=None):
+    """Record the wall-clock duration of a pipeline stage in seconds.
+
+    on_start(stage), if given, is called as the stage begins.
+    """
+    if on_start is not None:
+        on_start(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+        METRICS.observe('stage_seconds', timings[stage], stage=stage)
+
+
+class CertificateManager:
+    def __init__(self, credentials_path, folder_id, qr_format="link", registry=None, signing_key=None,
+                 drive_service=None, render_cache=None, pdf_profile="compact", upload_sessions=None,
+                 chunk_size=None):
+        if qr_format not in QR_FORMATS:
+            raise ValueError(f"qr_format must be one of {QR_FORMATS}, not {qr_format!r}")
+        if pdf_profile not in PDF_PROFILES:
+            raise ValueError(f"pdf_profile must be one of {PDF_PROFILES}, not {pdf_profile!r}")
+        self.SCOPES = DRIVE_SCOPES
+        self.folder_id = folder_id
+        self.qr_format = qr_format
+        # Optional CertificateRegistry that every issued certificate is written to
+        self.registry = registry
+        # HMAC key for signing compact payloads (see verifier.py)
+        self.signing_key = signing_key
+        # Optional RenderCache that lets unchanged certificates be reused (see render_cache.py)
+        self.render_cache = render_cache
+        self.pdf_profile = pdf_profile
+        # Optional upload_state.UploadSessions, and the resumable upload chunk size
+        # (default drive_uploader.DEFAULT_CHUNK_SIZE)
+        self.upload_sessions = upload_sessions
+        self.chunk_size = chunk_size
+        self.credentials_path = credentials_path
+        # The Drive client is created on first use, unless one is passed in
+        # (e.g. built with drive_client.build_drive_service against fake_drive.py)
+        self._drive_service = drive_service
+        self._drive_lock = threading.Lock()
+
+    @property
+    def credentials(self):
+        """Service-account credentials with a current access token.
+
+        Shared with every other manager and uploader using the same key
+        file, so the token is minted once and reused (see drive_client).
+        """
+        from drive_client import ensure_token, load_credentials
+        return ensure_token(load_credentials(self.credentials_path, self.SCOPES))
+
+    @property
+    def template(self):
+        """The CertificateTemplate for this manager's PDF output profile."""
+        from certificate_template import template_for
+        return template_for(self.pdf_profile)
+
+    @property
+    def drive_service(self):
+        if self._drive_service is not None:
+            return self._drive_service
+        credentials = self.credentials
+        with self._drive_lock:
+            if self._drive_service is None:
+                from drive_client import build_drive_service
+                self._drive_service = build_drive_service(credentials)
+            return self._drive_service
+
+    def warm_up(self):
+        """Load rendering and Drive dependencies ahead of the first certificate.
+
+        Meant to run on a background thread while the GUI starts; errors
+        such as missing credentials are left to surface on first real use.
+        """
+        # Importing is most of the cost; the modules are not used here
+        import certificate_template
+        import drive_uploader
+        from reportlab.lib.utils import ImageReader
+        render_qr("warm-up")
+        try:
+            self.drive_service
+        except Exception:
+            pass
+
+    @staticmethod
+    def generate_pdf_certificate(certificate_data, qr_image, pdf_filename, template=None):
+        """Generate a PDF certificate with a layout matching the provided format.
+
+        qr_image may be a file path, an ImageReader or a QRRaster, and pdf_filename a
+        path or a writable binary buffer such as io.BytesIO. template
+        defaults to certificate_template.DEFAULT_TEMPLATE.
+        """
+        if template is None:
+            from certificate_template import DEFAULT_TEMPLATE
+            template = DEFAULT_TEMPLATE
+        with METRICS.time('operation_seconds', operation="generate_pdf_certificate"):
+            template.render(certificate_data, qr_image, pdf_filename)
+
+    @staticmethod
+    def generate_qr_image(data):
+        """Generate a QR code from data and return it as a PIL image."""
+        return render_qr(data).image()
+
+    @staticmethod
+    def generate_qr_code(data, output_path):
+        """Generate QR code from data and save to output path."""
+        with METRICS.time('operation_seconds', operation="generate_qr_code"):
+            render_qr(data).save(output_path)
+        return output_path
+
+    def qr_data_for(self, certificate_data, file_id):
+        """Return what the certificate's QR code encodes.
+
+        "link" encodes the public Drive link; "compact" encodes the
+        certificate fields and Drive file ID as a qr_payload string.
+        """
+        from drive_uploader import drive_link_for
+        if self.qr_format == "compact":
+            return encode_payload(certificate_data, file_id, signing_key=self.signing_key)
+        return drive_link_for(file_id)
+
+    @staticmethod
+    def generate_group_pdf(entries, pdf_filename, split_dir=None, template=None):
+        """Render (certificate_data, qr_data) pairs into one multi-page PDF.
+
+        With split_dir the same render is also split into one file per
+        person there (needs pypdf), named by Certificate ID. Returns the
+        document path, page count, per-page paths and stage timings.
+        """
+        from certificate_template import DEFAULT_TEMPLATE, split_pages
+        template = template or DEFAULT_TEMPLATE
+        entries = list(entries)
+        timings = {}
+        with timed_stage(timings, 'qr'):
+            pages = [(data, render_qr(qr_data)) for data, qr_data in entries]
+        buffer = io.BytesIO()
+        with timed_stage(timings, 'render'):
+            template.render_group(pages, buffer)
+        directory = os.path.dirname(pdf_filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        pdf_bytes = buffer.getvalue()
+        with timed_stage(timings, 'write'):
+            with open(pdf_filename, "wb") as f:
+                f.write(pdf_bytes)
+        METRICS.inc('bytes_written_total', len(pdf_bytes), destination="disk")
+
+        split_paths = []
+        if split_dir:
+            os.makedirs(split_dir, exist_ok=True)
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            names = set()
+            for i, (data, _) in enumerate(entries, start=1):
+                name = data.get('Certificate ID', f"page{i}")
+                if name in names:
+                    # A repeated ID gets its page number, so no page overwrites another
+                    name = f"{name}_page{i}"
+                names.add(name)
+                split_paths.append(certificate_path(name, timestamp, split_dir, sharded=False))
+            with timed_stage(timings, 'split'):
+                split_pages(io.BytesIO(pdf_bytes), split_paths)
+        return {
+            'pdf_path': pdf_filename,
+            'pages': len(entries),
+            'split_paths': split_paths,
+            'timings': timings
+        }
+
+    @staticmethod
+    def reprint(record, output_dir="certificates", cache=None, template=None):
+        """Return a local PDF for a registry record, re-rendering it if missing.
+
+        The stored certificate data and QR payload are reused, so the
+        reprint matches the issued certificate and nothing is uploaded.
+        With a RenderCache, a cached copy is returned before re-rendering,
+        and a re-rendered PDF is added to it. template defaults to
+        certificate_template.DEFAULT_TEMPLATE.
+        """
+        if record['pdf_path'] and os.path.exists(record['pdf_path']):
+            return record['pdf_path']
+        if template is None:
+            from certificate_template import DEFAULT_TEMPLATE
+            template = DEFAULT_TEMPLATE
+        qr_data = record['qr_data'] or record['drive_link']
+        qr_format = "link" if qr_data == record['drive_link'] else "compact"
+        signed = qr_format == "compact" and unpack_payload(qr_data)[1] is not None
+        if cache is not None:
+            cached = cache.get(record['data'], template.profile, qr_format, signed)
+            if cached is not None and cached['qr_data'] == qr_data:
+                return cached['pdf_path']
+        pdf_bytes = CertificateManager.render_certificate(record['data'], render_qr(qr_data), template)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        pdf_filename = certificate_path(record['cert_id'], timestamp, output_dir)
+        os.makedirs(os.path.dirname(pdf_filename), exist_ok=True)
+        with open(pdf_filename, "wb") as f:
+            f.write(pdf_bytes)
+        if cache is not None:
+            cache.put(record['data'], pdf_bytes, record['drive_file_id'], record['drive_link'], qr_data,
+                      template.profile, qr_format, signed, source_path=pdf_filename)
+        return pdf_filename
+
+    @staticmethod
+    def render_certificate(certificate_data, qr_image, template=None):
+        """Render a certificate PDF in memory and return its bytes.
+
+        qr_image is a QRRaster, drawn as vector shapes, or a PIL image.
+        """
+        from reportlab.lib.utils import ImageReader
+        if not hasattr(qr_image, "draw"):
+            qr_image = ImageReader(qr_image)
+        buffer = io.BytesIO()
+        CertificateManager.generate_pdf_certificate(certificate_data, qr_image, buffer, template)
+        return buffer.getvalue()
+
+    def reserve_file_ids(self, count):
+        """Reserve up to 1000 Drive file IDs in a single request."""
+        from drive_uploader import execute_with_backoff
+        result = execute_with_backoff(self.drive_service.files().generateIds(
+            count=count,
+            space="drive"
+        ))
+        return result["ids"]
+
+    def reserve_file_id(self):
+        """Reserve a Drive file ID so the link is known before the PDF exists."""
+        return self.reserve_file_ids(1)[0]
+
+    def create_drive_file(self, source, file_name, file_id=None, progress=None):
+        """Upload a PDF to Drive, optionally under a reserved file ID.
+
+        source is either a file path or the PDF bytes. Large files go up
+        in resumable chunks; progress(sent, total), if given, is called
+        as they complete. A retried create of a reserved ID that already
+        landed counts as uploaded (see drive_uploader.create_pdf).
+        """
+        from drive_uploader import create_pdf
+        return create_pdf(self.drive_service, self.folder_id, source, file_name, file_id,
+                          chunk_size=self.chunk_size, sessions=self.upload_sessions, progress=progress)
+
+    def make_public(self, file_id):
+        """Grant anyone-with-the-link read access to a Drive file."""
+        from drive_uploader import execute_with_backoff
+        permission = {"role": "reader", "type": "anyone"}
+        execute_with_backoff(self.drive_service.permissions().create(
+            fileId=file_id, 
+            body=permission
+        ))
+
+    def upload_to_drive(self, source, file_name, file_id=None):
+        """Upload file (path or bytes) to Google Drive and return public link."""
+        from drive_uploader import drive_link_for
+        with METRICS.time('operation_seconds', operation="upload_to_drive"):
+            file_id = self.create_drive_file(source, file_name, file_id)
+
+            # Make file public
+            self.make_public(file_id)
+
+        return drive_link_for(file_id)
+
+    def process_certificate(self, certificate_data, save_local=True, progress=None):
+        """Process certificate data and generate all necessary files.
+
+        The Drive file ID is reserved up front, so the QR code can point at
+        the final link and the PDF is rendered and uploaded exactly once.
+        Rendering happens in memory; the PDF is written to disk only when
+        save_local is set. progress(stage), if given, is called as each
+        stage starts.
+
+        With a render cache, a certificate whose fields are unchanged since
+        it was last issued is not issued again: the earlier PDF, QR code
+        and Drive link are returned, with 'cached' set in the result. With a
+        registry, that only happens while the registry still holds that
+        issue, unrevoked; otherwise the certificate is issued again (see
+        registry.record_many).
+        """
+        cert_id = certificate_data.get('Certificate ID', 'unknown')
+        try:
+            result = self._reuse(certificate_data, progress) or self._issue(certificate_data, save_local, progress)
+        except Exception as e:
+            METRICS.inc('certificate_failures_total')
+            METRICS.log("certificate_failed", cert_id=cert_id, error=str(e))
+            raise
+        if result.get('cached'):
+            METRICS.log("certificate_reused", cert_id=cert_id, drive_link=result['drive_link'])
+            return result
+        METRICS.inc('certificates_issued_total')
+        METRICS.log("certificate_issued", cert_id=cert_id, drive_link=result['drive_link'],
+                    qr_version=result['qr_version'], timings=result['timings'])
+        return result
+
+    @property
+    def output(self):
+        """(PDF profile, QR format, signed) of the certificates this manager issues."""
+        return self.pdf_profile, self.qr_format, self.qr_format == "compact" and bool(self.signing_key)
+
+    def _reuse(self, certificate_data, progress):
+        """Return the cached result for unchanged certificate data, or None."""
+        if self.render_cache is None:
+            return None
+        timings = {}
+        with timed_stage(timings, 'cache', progress):
+            cached = self.render_cache.get(certificate_data, *self.output)
+            record = None
+            if cached is not None and self.registry is not None:
+                record = self.registry.get(certificate_data.get('Certificate ID', 'unknown'))
+        if cached is None or (cached['profile'], cached['qr_format'], cached['signed']) != self.output:
+            return None
+        if self.registry is not None and (record is None or record['revoked_at']
+                                          or record['drive_file_id'] != cached['file_id']):
+            # Only the certificate the registry holds, unrevoked, verifies; a
+            # cached copy of an earlier issue of the ID would be rejected
+            return None
+        if cached['signed'] and not verify_signature(cached['qr_data'], self.signing_key):
+            # Signed with a key that has since been replaced
+            return None
+        certificate_data['drive_link'] = cached['drive_link']
+        return {
+            'pdf_path': cached['pdf_path'],
+            'qr': render_qr(cached['qr_data']),
+            'qr_version': build_qr(cached['qr_data']).version,
+            'drive_link': cached['drive_link'],
+            'timings': timings,
+            'cached': True
+        }
+
+    def _issue(self, certificate_data, save_local, progress):
+        from drive_uploader import drive_link_for
+        timings = {}
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        cert_id = certificate_data.get('Certificate ID', 'unknown')
+        
+        # Reserve the Drive file ID so the link is known before rendering
+        with timed_stage(timings, 'reserve', progress):
+            file_id = self.reserve_file_id()
+        drive_link = drive_link_for(file_id)
+        certificate_data['drive_link'] = drive_link
+        
+        # Generate the QR code, which points at the final drive link
+        qr_data = self.qr_data_for(certificate_data, file_id)
+        with timed_stage(timings, 'qr', progress):
+            qr = render_qr(qr_data)
+        
+        # Render the PDF once, into memory
+        with timed_stage(timings, 'render', progress):
+            pdf_bytes = self.render_certificate(certificate_data, qr, self.template)
+        
+        pdf_filename = None
+        if save_local:
+            # Create output directory if it doesn't exist
+            pdf_filename = certificate_path(cert_id, timestamp)
+            os.makedirs(os.path.dirname(pdf_filename), exist_ok=True)
+            with timed_stage(timings, 'write', progress):
+                with open(pdf_filename, "wb") as f:
+                    f.write(pdf_bytes)
+            METRICS.inc('bytes_written_total', len(pdf_bytes), destination="disk")
+        
+        # Upload under the reserved ID, then make it public
+        with timed_stage(timings, 'upload', progress):
+            self.create_drive_file(pdf_bytes, f"Vaccine_Certificate_{cert_id}_{timestamp}.pdf", file_id,
+                                   progress=upload_progress(progress))
+        with timed_stage(timings, 'permission', progress):
+            self.make_public(file_id)
+        
+        if self.registry is not None:
+            with timed_stage(timings, 'register', progress):
+                self.registry.record(certificate_data, file_id, drive_link, pdf_filename, qr_data)
+        
+        if self.render_cache is not None:
+            # The certificate is already on Drive, so a full disk must not fail it
+            try:
+                self.render_cache.put(certificate_data, pdf_bytes, file_id, drive_link, qr_data, *self.output,
+                                      source_path=pdf_filename)
+            except OSError as e:
+                METRICS.log("render_cache_failed", cert_id=cert_id, error=str(e))
+        
+        return {
+            'pdf_path': pdf_filename,
+            'qr': qr,
+            'qr_version': qr.version,
+            'drive_link': drive_link,
+            'timings': timings
+        }
+
+
+def upload_progress(progress):
+    """Adapt a stage progress callback to also report how far an upload got."""
+    if progress is None:
+        return None
+    return lambda sent, total: progress(f"upload {sent * 100 // max(total, 1)}%")
+
+
+def format_timings(timings):
+    """Format a per-stage timing dict as a one-line report."""
+    parts = [f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items()]
+    parts.append(f"total={sum(timings.values()) * 1000:.1f}ms")
+    return " ".join(parts)
@@ -0,0 +1,297 @@
+import functools
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import textwrap
+import threading
+from contextlib import contextmanager
+
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfmetrics import standardFonts, stringWidth
+from reportlab.pdfgen import canvas
+
+# Bump whenever the certificate layout changes
+TEMPLATE_VERSION = 1
+
+# How certificates are written to PDF. None leaves ReportLab's default.
+#   compress: Flate-compress page content streams
+#   ascii85:  ASCII85-encode compressed streams (7-bit safe, but a quarter larger)
+#   qr:       "vector" draws a QRRaster as filled shapes, "image" embeds it as an RGB image
+#   pdfa:     convert to PDF/A-2b with Ghostscript (embeds fonts, so files grow)
+PDF_PROFILES = {
+    'compact': {'compress': 1, 'ascii85': 0, 'qr': "vector", 'pdfa': False},
+    'archival': {'compress': 1, 'ascii85': 0, 'qr': "vector", 'pdfa': True},
+    'legacy': {'compress': None, 'ascii85': None, 'qr': "image", 'pdfa': False},
+}
+DEFAULT_PROFILE = "compact"
+
+# ReportLab reads rl_config.useA85 while drawing and saving, it has no
+# per-canvas equivalent, and profiles disagree on it. Documents are
+# therefore drawn one at a time under this lock, so a render on one
+# thread never sees another profile's setting.
+_RL_CONFIG_LOCK = threading.Lock()
+
+FOOTER_TEXT = (
+    "This report has been issued electronically. Any party that relies on the result of this report "
+    "should first check its authenticity by contacting the issuing authority. "
+    "The authority is not responsible for any misuse of this report or its contents."
+)
+
+TABLE_HEADERS = ["Name of Vaccine", "Number of Dose", "Given date", "Batch NO", "Exp. Date", "Mfg Date", "Mfg By"]
+TABLE_X = [50, 200, 300, 400, 470, 540, 610]
+TABLE_FIELDS = ['Vaccine Name', 'Dose Information', 'Date', 'Batch', 'Exp Date', 'Mfg Date', 'Manufacturer']
+
+# (label, x, y offset from the top of the page, font, size, field, suffix)
+LABELED_FIELDS = [
+    ("Patient Name: ", 50, 90, "Helvetica", 12, 'Full Name', ""),
+    ("Age: ", 400, 90, "Helvetica", 12, 'Age', "Y"),
+    ("Invoice No: ", 50, 115, "Helvetica", 12, 'Certificate ID', ""),
+    ("Invoice Date: ", 300, 115, "Helvetica", 12, 'Date', ""),
+    ("Gender: ", 500, 115, "Helvetica", 12, 'Gender', ""),
+    ("Referred By: ", 50, 140, "Helvetica", 12, 'Referred By', ""),
+    ("Vaccination Certificate of ", 50, 180, "Helvetica-Bold", 14, 'Vaccine Name', ""),
+    ("Facility: ", 50, 210, "Helvetica", 12, 'Facility', ""),
+    ("Mode: ", 300, 210, "Helvetica", 12, 'Mode', ""),
+    ("Case ID: ", 50, 235, "Helvetica", 12, 'Certificate ID', ""),
+    ("Mobile: ", 300, 235, "Helvetica", 12, 'Mobile', ""),
+    ("Passport: ", 50, 260, "Helvetica", 12, 'Passport', ""),
+    ("NID No: ", 300, 260, "Helvetica", 12, 'NID', ""),
+    ("Address: ", 50, 285, "Helvetica", 12, 'Address', ""),
+]
+
+
+class CertificateTemplate:
+    """Certificate layout split into a static layer and per-person fields.
+
+    The static layer (header, rules, field labels, table headers, the
+    "To Whom It May Concern" heading and the wrapped footer) is laid out
+    once when the template is built. In a document holding several
+    certificates it is drawn once as a PDF form XObject that every page
+    references; stamp() then draws just the personal fields.
+
+    With precompiled=False the layout is rebuilt and drawn directly on
+    every call, which is how certificates were rendered before; it is
+    kept for benchmarking.
+
+    profile names one of PDF_PROFILES. Only the 14 standard PDF fonts
+    are used, which viewers provide, so no font is ever embedded.
+    """
+
+    form_name = f"certificate_static_v{TEMPLATE_VERSION}"
+
+    def __init__(self, pagesize=A4, precompiled=True, profile=DEFAULT_PROFILE):
+        if profile not in PDF_PROFILES:
+            raise ValueError(f"profile must be one of {tuple(PDF_PROFILES)}, not {profile!r}")
+        self.pagesize = pagesize
+        self.precompiled = precompiled
+        self.profile = profile
+        self.settings = PDF_PROFILES[profile]
+        self._build_layout()
+
+    def _build_layout(self):
+        width, height = self.pagesize
+        self.labels = []
+        self.values = []
+        for label, x, offset, font, size, field, suffix in LABELED_FIELDS:
+            if font not in standardFonts:
+                raise ValueError(f"{font} is not a standard PDF font and would have to be embedded")
+            y = height - offset
+            self.labels.append((label, x, y, font, size))
+            value_x = x + stringWidth(label, font, size)
+            self.values.append((value_x, y, font, size, field, suffix))
+        self.table_y = height - 335
+        self.concern_y = height - 410
+        self.footer_lines = textwrap.wrap(FOOTER_TEXT, width=100)
+
+    def draw_static(self, c):
+        """Draw the parts of the page that are identical for everyone."""
+        width, height = self.pagesize
+
+        # Header - Print Report
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(50, height-50, "Print Report")
+        c.line(50, height-60, width-50, height-60)
+
+        for label, x, y, font, size in self.labels:
+            c.setFont(font, size)
+            c.drawString(x, y, label)
+
+        # Vaccine information table headers and rules
+        c.setFont("Helvetica-Bold", 12)
+        for header, x in zip(TABLE_HEADERS, TABLE_X):
+            c.drawString(x, self.table_y, header)
+        c.line(50, self.table_y + 10, width-50, self.table_y + 10)
+        c.line(50, self.table_y - 30, width-50, self.table_y - 30)
+
+        c.drawString(50, self.concern_y, "To Whom It May Concern")
+
+        # Footer text
+        c.setFont("Helvetica", 8)
+        text_object = c.beginText(50, 50)
+        for line in self.footer_lines:
+            text_object.textLine(line)
+        c.drawText(text_object)
+
+    def stamp(self, c, certificate_data, qr_image, use_form=True):
+        """Draw one certificate page onto canvas c.
+
+        With use_form the static layer is referenced as a form XObject,
+        which pays off once a document holds more than one page.
+        """
+        width, height = self.pagesize
+        if not self.precompiled:
+            self._build_layout()
+            self.draw_static(c)
+        elif use_form:
+            if not c.hasForm(self.form_name):
+                c.beginForm(self.form_name)
+                self.draw_static(c)
+                c.endForm()
+            c.doForm(self.form_name)
+        else:
+            self.draw_static(c)
+
+        for x, y, font, size, field, suffix in self.values:
+            c.setFont(font, size)
+            c.drawString(x, y, f"{certificate_data.get(field, '')}{suffix}")
+
+        # Table data
+        c.setFont("Helvetica", 10)
+        for x, field in zip(TABLE_X, TABLE_FIELDS):
+            c.drawString(x, self.table_y - 25, certificate_data.get(field, ''))
+
+        concern_text = (
+            f"This is to certify that {certificate_data.get('Full Name', '')}, "
+            f"Date of Birth: {certificate_data.get('DOB', '')}, {certificate_data.get('Nationality', 'Bangladesh')} citizen, "
+            f"Passport No: {certificate_data.get('Passport', '')} has been vaccinated with {certificate_data.get('Vaccine Name', '')}. "
+            "We wish them all the best for their future endeavors."
+        )
+        text_object = c.beginText(50, self.concern_y - 25)
+        text_object.setFont("Helvetica", 11)
+        for line in textwrap.wrap(concern_text, width=90):
+            text_object.textLine(line)
+        c.drawText(text_object)
+
+        # Add QR code on the right side; a QRRaster draws itself as vector shapes
+        qr_size = 100
+        if hasattr(qr_image, "draw") and self.settings['qr'] == "vector":
+            qr_image.draw(c, width-150, 50, qr_size)
+        else:
+            if hasattr(qr_image, "draw"):
+                qr_image = ImageReader(qr_image.image())
+            c.drawImage(qr_image, width-150, 50, width=qr_size, height=qr_size)
+
+    @contextmanager
+    def _document(self, pdf_filename):
+        """Yield a canvas for a document in this profile, saved and converted on exit."""
+        ascii85 = self.settings['ascii85']
+        target = io.BytesIO() if self.settings['pdfa'] else pdf_filename
+        with _RL_CONFIG_LOCK:
+            previous = rl_config.useA85
+            if ascii85 is not None:
+                rl_config.useA85 = ascii85
+            try:
+                c = canvas.Canvas(target, pagesize=self.pagesize, pageCompression=self.settings['compress'])
+                yield c
+                c.save()
+            finally:
+                rl_config.useA85 = previous
+        # Ghostscript runs outside the lock, so conversions overlap
+        if self.settings['pdfa']:
+            pdf_bytes = convert_to_pdfa(target.getvalue())
+            if hasattr(pdf_filename, "write"):
+                pdf_filename.write(pdf_bytes)
+            else:
+                with open(pdf_filename, "wb") as f:
+                    f.write(pdf_bytes)
+
+    def render(self, certificate_data, qr_image, pdf_filename):
+        """Render a single-page certificate to a path or binary buffer."""
+        with self._document(pdf_filename) as c:
+            # A form XObject only adds overhead to a single-page document
+            self.stamp(c, certificate_data, qr_image, use_form=False)
+
+    def render_group(self, entries, pdf_filename):
+        """Render (certificate_data, qr_image) pairs as pages of one document.
+
+        The static layer is a single form XObject shared by every page,
+        and fonts and identical images are stored once per document.
+        Returns the number of pages.
+        """
+        pages = 0
+        with self._document(pdf_filename) as c:
+            for certificate_data, qr_image in entries:
+                self.stamp(c, certificate_data, qr_image)
+                c.showPage()
+                pages += 1
+        return pages
+
+
+def find_ghostscript():
+    """Return the path of the Ghostscript executable, or None."""
+    for name in ("gs", "gswin64c", "gswin32c"):
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def convert_to_pdfa(pdf_bytes):
+    """Return pdf_bytes converted to PDF/A-2b by Ghostscript.
+
+    PDF/A requires every font to be embedded, so Ghostscript embeds
+    the standard fonts and the result is larger than the input.
+    """
+    gs = find_ghostscript()
+    if gs is None:
+        raise RuntimeError("PDF/A output needs Ghostscript (gs) on the PATH")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = os.path.join(tmp_dir, "in.pdf")
+        output = os.path.join(tmp_dir, "out.pdf")
+        with open(source, "wb") as f:
+            f.write(pdf_bytes)
+        proc = subprocess.run(
+            [gs, "-q", "-dPDFA=2", "-dPDFACompatibilityPolicy=1", "-dBATCH", "-dNOPAUSE", "-dSAFER",
+             "-sDEVICE=pdfwrite", "-sColorConversionStrategy=RGB", f"-sOutputFile={output}", source],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"Ghostscript failed: {proc.stderr.strip() or proc.stdout.strip()}")
+        with open(output, "rb") as f:
+            return f.read()
+
+
+def split_pages(pdf_source, filenames):
+    """Write each page of a group PDF to its own file, in order.
+
+    Needs the optional pypdf package. Each output file gets its own copy
+    of the shared static form, so it stands alone.
+    """
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        raise ImportError("Splitting a group PDF needs pypdf (pip install pypdf)") from None
+    reader = PdfReader(pdf_source)
+    if len(reader.pages) != len(filenames):
+        raise ValueError(f"Document has {len(reader.pages)} pages but {len(filenames)} file names were given")
+    for page, filename in zip(reader.pages, filenames):
+        writer = PdfWriter()
+        writer.add_page(page)
+        writer.compress_identical_objects()
+        with open(filename, "wb") as f:
+            writer.write(f)
+
+
+DEFAULT_TEMPLATE = CertificateTemplate()
+
+
+@functools.lru_cache(maxsize=None)
+def template_for(profile=DEFAULT_PROFILE):
+    """Return the shared template for an output profile."""
+    if profile == DEFAULT_TEMPLATE.profile:
+        return DEFAULT_TEMPLATE
+    return CertificateTemplate(profile=profile)
@@ -0,0 +1,141 @@
+"""Shared Google Drive credentials and API clients.
+
+Service-account credentials are loaded once per key file and shared by
+every CertificateManager and DriveUploader in the process, so they all
+reuse one access token until shortly before it expires. The token is
+also saved to a small cache file in the user's cache directory
+(readable only by the owner, and outside certificates/, which is shared
+and backed up), which lets a restarted app or the next batch run skip
+minting a new one while it is still good.
+
+The Drive discovery document is the copy bundled with
+google-api-python-client, parsed once per process; nothing is fetched
+over the network to build a client. The Google libraries themselves are
+imported on first use, as they are slow to load.
+"""
+import datetime
+import functools
+import json
+import os
+import threading
+
+DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive.file"]
+
+
+def user_cache_dir():
+    """Return this app's per-user cache directory (%LOCALAPPDATA% on Windows, else XDG)."""
+    base = (os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME")
+            or os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "vaccine-certificates")
+
+
+DEFAULT_TOKEN_CACHE = os.path.join(user_cache_dir(), "drive_token.json")
+# Tokens this close to expiry are refreshed instead of reused
+TOKEN_EXPIRY_MARGIN = datetime.timedelta(minutes=5)
+
+_credentials = {}
+_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def discovery_document(api_endpoint=None):
+    """Return the parsed Drive v3 discovery document, optionally re-pointed.
+
+    The document is rewritten rather than using client_options, so that
+    media uploads and the batch endpoint go to the same server (e.g.
+    fake_drive.py) as the regular API calls.
+    """
+    from googleapiclient.discovery_cache import get_static_doc
+    doc = json.loads(get_static_doc("drive", "v3"))
+    if api_endpoint:
+        root_url = api_endpoint.rstrip("/") + "/"
+        doc["rootUrl"] = root_url
+        doc["baseUrl"] = root_url + doc["servicePath"]
+    return doc
+
+
+def build_drive_service(credentials, api_endpoint=None):
+    """Build a Drive v3 client from the cached discovery document."""
+    from googleapiclient.discovery import build_from_document
+    return build_from_document(discovery_document(api_endpoint), credentials=credentials)
+
+
+def _utcnow():
+    # google-auth keeps expiry as a naive UTC datetime
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _token_is_fresh(credentials):
+    return (credentials.token is not None and credentials.expiry is not None
+            and credentials.expiry - TOKEN_EXPIRY_MARGIN > _utcnow())
+
+
+def restore_token(credentials, token_cache=DEFAULT_TOKEN_CACHE):
+    """Load a cached access token into credentials if it is still fresh."""
+    try:
+        with open(token_cache, encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if (cached.get("account") != credentials.service_account_email
+            or sorted(cached.get("scopes", [])) != sorted(credentials.scopes or [])):
+        return False
+    credentials.token = cached.get("token")
+    credentials.expiry = datetime.datetime.fromisoformat(cached["expiry"]) if cached.get("expiry") else None
+    if not _token_is_fresh(credentials):
+        credentials.token = credentials.expiry = None
+        return False
+    return True
+
+
+def save_token(credentials, token_cache=DEFAULT_TOKEN_CACHE):
+    """Write the current access token to the cache file, owner-readable only."""
+    directory = os.path.dirname(token_cache)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = token_cache + ".tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({
+            "account": credentials.service_account_email,
+            "scopes": list(credentials.scopes or []),
+            "token": credentials.token,
+            "expiry": credentials.expiry.isoformat() if credentials.expiry else None,
+        }, f)
+    os.replace(tmp_path, token_cache)
+
+
+def ensure_token(credentials, token_cache=DEFAULT_TOKEN_CACHE):
+    """Refresh the access token if it is missing or about to expire.
+
+    A freshly minted token is written to token_cache (unless it is None).
+    """
+    with _lock:
+        if _token_is_fresh(credentials):
+            return credentials
+        import google_auth_httplib2
+        import httplib2
+        credentials.refresh(google_auth_httplib2.Request(httplib2.Http()))
+        if token_cache:
+            save_token(credentials, token_cache)
+    return credentials
+
+
+def load_credentials(credentials_path, scopes=DRIVE_SCOPES, token_cache=DEFAULT_TOKEN_CACHE):
+    """Return the process-wide credentials for a service-account key file.
+
+    The first call for a key file reads it and restores a cached token;
+    later calls return the same object.
+    """
+    key = (os.path.abspath(credentials_path), tuple(scopes))
+    with _lock:
+        credentials = _credentials.get(key)
+        if credentials is None:
+            from google.oauth2 import service_account
+            credentials = service_account.Credentials.from_service_account_file(
+                credentials_path, scopes=scopes
+            )
+            if token_cache:
+                restore_token(credentials, token_cache)
+            _credentials[key] = credentials
+    return credentials
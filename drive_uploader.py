@@ -0,0 +1,388 @@
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import google_auth_httplib2
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest, MediaFileUpload, MediaIoBaseUpload
+
+from drive_client import build_drive_service
+from metrics import METRICS
+from upload_state import UPLOAD_LIMITER
+
+# Drive accepts at most 100 calls in one batch request
+PERMISSION_BATCH_SIZE = 100
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+PUBLIC_PERMISSION = {"role": "reader", "type": "anyone"}
+# Files larger than one chunk are uploaded in chunks through a resumable
+# session; Drive needs chunk sizes in multiples of 256 KiB
+CHUNK_UNIT = 256 * 1024
+DEFAULT_CHUNK_SIZE = 4 * CHUNK_UNIT
+
+
+def drive_link_for(file_id):
+    """Return the public view link for a Drive file ID."""
+    return f"https://drive.google.com/file/d/{file_id}/view"
+
+
+def media_body_for(source, mimetype="application/pdf"):
+    """Wrap a file path or in-memory bytes as an upload media body."""
+    if isinstance(source, (bytes, bytearray)):
+        return MediaIoBaseUpload(io.BytesIO(source), mimetype=mimetype)
+    return MediaFileUpload(source, mimetype=mimetype)
+
+
+def is_retryable(error):
+    """Return True for 429/5xx responses and 403 rate-limit errors."""
+    if isinstance(error, (ConnectionError, TimeoutError, httplib2.HttpLib2Error)):
+        return True
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    if status == 429 or status >= 500:
+        return True
+    if status == 403:
+        try:
+            errors = json.loads(error.content)["error"]["errors"]
+        except (ValueError, KeyError, TypeError):
+            return False
+        return any(e.get("reason") in RATE_LIMIT_REASONS for e in errors)
+    return False
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=32.0):
+    """Exponential backoff with full jitter for the given retry attempt."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def source_size(source):
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    return os.path.getsize(source)
+
+
+def source_digest(source):
+    """SHA-256 of a file path or bytes, identifying the content of an upload."""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def session_state(http, uri, size):
+    """Ask Drive how much of a resumable upload it has received.
+
+    Returns the number of bytes received, the file resource if the
+    upload already finished, or None if the session has expired.
+    """
+    resp, content = http.request(uri, "PUT", headers={"Content-Range": f"bytes */{size}", "Content-Length": "0"})
+    if resp.status in (200, 201):
+        return json.loads(content)
+    if resp.status == 308:
+        received = resp.get("range")
+        return int(received.split("-")[1]) + 1 if received else 0
+    if resp.status in (404, 410):
+        return None
+    raise HttpError(resp, content, uri=uri)
+
+
+def upload_media(service, metadata, source, http=None, chunk_size=None, sessions=None, progress=None,
+                 max_retries=5, on_retry=None):
+    """Create a Drive file with content from a path or bytes; returns the file resource.
+
+    Every byte sent is paced by the process-wide UPLOAD_LIMITER.
+    Files that fit in one chunk go up in a single request. Larger ones
+    are sent chunk by chunk through a resumable session, and after an
+    error only the part Drive has not received is sent again. With an
+    UploadSessions store the session URI is saved as well, so a later
+    call for the same file and content resumes the session even after
+    a restart. progress(sent, total), if given, is called after every
+    chunk.
+    """
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    if chunk_size % CHUNK_UNIT:
+        raise ValueError(f"chunk_size must be a multiple of {CHUNK_UNIT} bytes")
+    size = source_size(source)
+    if size <= chunk_size:
+        # Resuming a single chunk would resend all of it anyway
+        request = service.files().create(body=metadata, media_body=media_body_for(source), fields="id")
+        # Every attempt sends the whole file, so each one is metered
+        response = execute_with_backoff(request, http=http, max_retries=max_retries, on_retry=on_retry,
+                                        before_attempt=lambda: UPLOAD_LIMITER.acquire(size))
+        if progress:
+            progress(size, size)
+        return response
+
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else open(source, "rb")
+    with stream:
+        media = MediaIoBaseUpload(UPLOAD_LIMITER.wrap(stream), mimetype=metadata.get("mimeType", "application/pdf"),
+                                  chunksize=chunk_size, resumable=True)
+        request = service.files().create(body=metadata, media_body=media, fields="id")
+        http = http or request.http
+        key = metadata.get("id") or metadata["name"]
+        digest = source_digest(source) if sessions is not None else None
+        saved_uri = sessions.get(key, digest) if sessions is not None else None
+        if saved_uri:
+            state = session_state(http, saved_uri, size)
+            if isinstance(state, dict):
+                sessions.discard(key)
+                return state
+            if state is not None:
+                request.resumable_uri = saved_uri
+                request.resumable_progress = state
+                METRICS.inc('upload_resumes_total')
+
+        response = None
+        # Failures since Drive last acknowledged more of the file. After an
+        # error every call makes two requests, asking Drive what arrived
+        # and then resending, so a chunk may fail twice per retry.
+        failures = 0
+        acknowledged = request.resumable_progress
+        while response is None:
+            try:
+                status, response = request.next_chunk(http=http)
+            except Exception as e:
+                if request.resumable_progress > acknowledged:
+                    acknowledged = request.resumable_progress
+                    failures = 0
+                expired = (isinstance(e, HttpError) and e.resp.status in (404, 410)
+                           and request.resumable_uri is not None)
+                if failures >= 2 * max_retries or not (expired or is_retryable(e)):
+                    raise
+                if expired:
+                    # Start a new session from the beginning
+                    request.resumable_uri = None
+                    request.resumable_progress = acknowledged = 0
+                METRICS.inc('drive_retries_total')
+                if on_retry:
+                    on_retry(e)
+                time.sleep(backoff_delay(failures // 2))
+                failures += 1
+                # The next call asks Drive what arrived and continues from there
+                continue
+            finally:
+                if sessions is not None and request.resumable_uri and request.resumable_uri != saved_uri:
+                    saved_uri = request.resumable_uri
+                    sessions.save(key, digest, size, saved_uri)
+            failures = 0
+            acknowledged = request.resumable_progress
+            if status is not None and progress:
+                progress(status.resumable_progress, size)
+    if sessions is not None:
+        sessions.discard(key)
+    if progress:
+        progress(size, size)
+    return response
+
+
+def create_pdf(service, folder_id, source, file_name, file_id=None, **upload_options):
+    """Upload a PDF from a path or bytes into folder_id and return its file ID.
+
+    With a reserved file_id, a 409 means an earlier attempt of this
+    create reached Drive and only its response was lost, so the file is
+    already there. upload_options are passed on to upload_media.
+    """
+    file_metadata = {
+        "name": file_name,
+        "mimeType": "application/pdf",
+        "parents": [folder_id]
+    }
+    if file_id:
+        file_metadata["id"] = file_id
+    try:
+        uploaded_id = upload_media(service, file_metadata, source, **upload_options)["id"]
+    except HttpError as e:
+        if not (file_id and e.resp.status == 409):
+            METRICS.inc('upload_failures_total')
+            raise
+        uploaded_id = file_id
+    except Exception:
+        METRICS.inc('upload_failures_total')
+        raise
+    METRICS.inc('uploads_total')
+    if isinstance(source, (bytes, bytearray)):
+        METRICS.inc('bytes_written_total', len(source), destination="drive")
+    return uploaded_id
+
+
+def execute_with_backoff(request, http=None, max_retries=5, base_delay=1.0, on_retry=None, before_attempt=None):
+    """Execute a Drive API request, retrying rate-limit and server errors.
+
+    before_attempt(), if given, is called before every attempt.
+    """
+    attempt = 0
+    while True:
+        if before_attempt:
+            before_attempt()
+        try:
+            return request.execute(http=http)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            METRICS.inc('drive_retries_total')
+            if on_retry:
+                on_retry(e)
+            time.sleep(backoff_delay(attempt, base_delay))
+            attempt += 1
+
+
+class DriveUploader:
+    """Concurrent Drive uploader with per-thread HTTP connections.
+
+    At most max_concurrency uploads run at once. Each worker thread keeps
+    its own authorized httplib2 connection, since httplib2 objects must
+    not be shared between threads. Permission grants are sent through
+    the Drive batch endpoint, up to 100 per HTTP request. Uploads share
+    the process-wide bandwidth limit, and files larger than chunk_size
+    go through resumable sessions (see upload_media).
+    """
+
+    def __init__(self, credentials, folder_id, max_concurrency=4, max_retries=5,
+                 api_endpoint=None, timeout=60, chunk_size=None, sessions=None):
+        self.credentials = credentials
+        self.folder_id = folder_id
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        # Optional upload_state.UploadSessions for resuming large uploads
+        self.sessions = sessions
+        self.drive_service = build_drive_service(credentials, api_endpoint)
+        self.batch_uri = (api_endpoint.rstrip("/") + "/batch/drive/v3") if api_endpoint else None
+        self.retries = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency,
+                                            thread_name_prefix="drive-upload")
+
+    @classmethod
+    def from_manager(cls, cert_manager, **kwargs):
+        """Create an uploader sharing a CertificateManager's credentials, folder and upload settings."""
+        kwargs.setdefault("chunk_size", cert_manager.chunk_size)
+        kwargs.setdefault("sessions", cert_manager.upload_sessions)
+        return cls(cert_manager.credentials, cert_manager.folder_id, **kwargs)
+
+    def _http(self):
+        """Return this thread's authorized HTTP connection."""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            raw = httplib2.Http(timeout=self.timeout)
+            # Drive answers unfinished resumable uploads with 308, which is not a redirect
+            raw.redirect_codes = raw.redirect_codes - {308}
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=raw)
+            self._local.http = http
+        return http
+
+    def _count_retry(self, error):
+        with self._lock:
+            self.retries += 1
+
+    def _execute(self, request):
+        return execute_with_backoff(request, http=self._http(), max_retries=self.max_retries,
+                                    on_retry=self._count_retry)
+
+    def reserve_ids(self, count):
+        """Reserve up to 1000 Drive file IDs."""
+        request = self.drive_service.files().generateIds(count=count, space="drive")
+        return self._execute(request)["ids"]
+
+    def upload(self, source, file_name, file_id=None, progress=None):
+        """Upload a PDF from a path or bytes and return its file ID.
+
+        Blocks the calling thread. progress(sent, total) is called as
+        chunks complete (see upload_media).
+        """
+        return create_pdf(self.drive_service, self.folder_id, source, file_name, file_id, http=self._http(),
+                          chunk_size=self.chunk_size, sessions=self.sessions, progress=progress,
+                          max_retries=self.max_retries, on_retry=self._count_retry)
+
+    def submit_task(self, fn, *args, **kwargs):
+        """Run fn on an upload thread and return its Future.
+
+        Blocks while max_concurrency tasks are already running, which
+        gives callers feeding from a queue natural backpressure.
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def submit(self, source, file_name, file_id=None, progress=None):
+        """Queue an upload and return a Future for its file ID."""
+        return self.submit_task(self.upload, source, file_name, file_id, progress)
+
+    def grant_public(self, file_ids):
+        """Make files readable by anyone with the link.
+
+        Returns a dict mapping each file ID to None on success or to the
+        error that prevented the grant.
+        """
+        errors = {}
+        remaining = list(file_ids)
+        attempt = 0
+        while remaining:
+            for file_id in remaining:
+                errors.pop(file_id, None)
+            failed = {}
+            for start in range(0, len(remaining), PERMISSION_BATCH_SIZE):
+                failed.update(self._grant_batch(remaining[start:start + PERMISSION_BATCH_SIZE]))
+            remaining = [fid for fid, e in failed.items() if is_retryable(e)]
+            errors.update(failed)
+            if not remaining or attempt >= self.max_retries:
+                break
+            self._count_retry(None)
+            METRICS.inc('drive_retries_total')
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+        return {file_id: errors.get(file_id) for file_id in file_ids}
+
+    def _grant_batch(self, file_ids):
+        failed = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                failed[request_id] = exception
+
+        batch = BatchHttpRequest(callback=callback, batch_uri=self.batch_uri)
+        for file_id in file_ids:
+            batch.add(
+                self.drive_service.permissions().create(fileId=file_id, body=PUBLIC_PERMISSION),
+                request_id=file_id
+            )
+        try:
+            execute_with_backoff(batch, http=self._http(), max_retries=self.max_retries,
+                                 on_retry=self._count_retry)
+        except Exception as e:
+            return {file_id: e for file_id in file_ids}
+        return failed
+
+    def upload_public(self, source, file_name, file_id=None):
+        """Upload one file, make it public and return its link."""
+        file_id = self.upload(source, file_name, file_id)
+        error = self.grant_public([file_id])[file_id]
+        if error is not None:
+            raise error
+        return drive_link_for(file_id)
+
+    def close(self):
+        """Wait for queued uploads and stop the worker threads."""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
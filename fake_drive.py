@@ -0,0 +1,258 @@
+"""Minimal in-memory stand-in for the Google Drive v3 API.
+
+Serves the calls this project makes (generateIds, multipart and
+resumable file create, permission create and the batch endpoint) so the
+uploader can be exercised without network access or credentials:
+
+    python fake_drive.py --port 8765 --fail-rate 0.1 --latency 0.05 --uplink 125000
+
+and then DriveUploader(AnonymousCredentials(), "folder",
+api_endpoint="http://127.0.0.1:8765").
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PERMISSION_PATH = re.compile(r"^/drive/v3/files/([^/]+)/permissions$")
+CONTENT_RANGE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+
+class FakeDrive:
+    """Thread-safe store of uploaded files and their permissions."""
+
+    def __init__(self, fail_rate=0.0, latency=0.0, uplink=None):
+        self.fail_rate = fail_rate
+        self.latency = latency
+        # Simulated upload bandwidth in bytes/sec, shared by all uploads
+        self.uplink = uplink
+        self.files = {}
+        # upload_id -> (metadata, bytes received so far) of resumable uploads
+        self.sessions = {}
+        self.requests = 0
+        # File content bytes received, including any sent twice
+        self.received = 0
+        self.lock = threading.Lock()
+        self.line = threading.Lock()
+
+    def transfer(self, size):
+        """Hold the simulated uplink for as long as size bytes take to send."""
+        with self.lock:
+            self.received += size
+        if self.uplink:
+            with self.line:
+                time.sleep(size / self.uplink)
+
+    def maybe_fail(self):
+        """Return an injected (status, body) error, or None."""
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() >= self.fail_rate:
+            return None
+        if random.random() < 0.5:
+            return 503, {"error": {"code": 503, "message": "Backend Error",
+                                   "errors": [{"reason": "backendError"}]}}
+        return 403, {"error": {"code": 403, "message": "Rate Limit Exceeded",
+                               "errors": [{"reason": "userRateLimitExceeded"}]}}
+
+    def generate_ids(self, count):
+        return 200, {"kind": "drive#generatedIds", "space": "drive",
+                     "ids": [uuid.uuid4().hex[:28] for _ in range(count)]}
+
+    def create_file(self, metadata, content):
+        self.transfer(len(content))
+        return self._add_file(metadata, content)
+
+    def _add_file(self, metadata, content):
+        file_id = metadata.get("id") or uuid.uuid4().hex[:28]
+        with self.lock:
+            if file_id in self.files:
+                return 409, {"error": {"code": 409, "message": "File already exists",
+                                       "errors": [{"reason": "duplicate"}]}}
+            self.files[file_id] = {"name": metadata.get("name"), "size": len(content),
+                                   "public": False}
+        return 200, {"id": file_id}
+
+    def start_session(self, metadata, host):
+        upload_id = uuid.uuid4().hex
+        with self.lock:
+            self.sessions[upload_id] = (metadata, bytearray())
+        location = f"http://{host}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+        return 200, {}, {"Location": location}
+
+    def upload_chunk(self, upload_id, content_range, content):
+        """Store one chunk of a resumable upload (or answer a status query)."""
+        with self.lock:
+            session = self.sessions.get(upload_id)
+        if session is None:
+            return 404, {"error": {"code": 404, "message": "Upload session not found"}}
+        metadata, data = session
+        match = CONTENT_RANGE.fullmatch(content_range or "")
+        if match is None:
+            return 400, {"error": {"code": 400, "message": f"Bad Content-Range {content_range!r}"}}
+        start, _, total = match.groups()
+        if start is not None:
+            self.transfer(len(content))
+            # A chunk may overlap what arrived before, but not leave a gap
+            if int(start) <= len(data):
+                del data[int(start):]
+                data.extend(content)
+        if total != "*" and len(data) >= int(total):
+            with self.lock:
+                self.sessions.pop(upload_id, None)
+            return self._add_file(metadata, bytes(data))
+        headers = {"Range": f"bytes=0-{len(data) - 1}"} if data else {}
+        return 308, {}, headers
+
+    def create_permission(self, file_id):
+        with self.lock:
+            if file_id not in self.files:
+                return 404, {"error": {"code": 404, "message": "File not found",
+                                       "errors": [{"reason": "notFound"}]}}
+            self.files[file_id]["public"] = True
+        return 200, {"kind": "drive#permission", "id": "anyoneWithLink",
+                     "type": "anyone", "role": "reader"}
+
+    def dispatch(self, method, url, headers, body):
+        """Route one API call and return (status, json body), or with extra response headers."""
+        with self.lock:
+            self.requests += 1
+        failure = self.maybe_fail()
+        if failure:
+            return failure
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        if method == "GET" and parsed.path == "/drive/v3/files/generateIds":
+            return self.generate_ids(int(query.get("count", ["10"])[0]))
+        if method == "POST" and parsed.path == "/upload/drive/v3/files":
+            if query.get("uploadType") == ["resumable"]:
+                return self.start_session(json.loads(body or b"{}"), headers.get("Host"))
+            metadata, content = parse_multipart_upload(headers.get("Content-Type", ""), body)
+            return self.create_file(metadata, content)
+        if method == "PUT" and parsed.path == "/upload/drive/v3/files":
+            return self.upload_chunk(query.get("upload_id", [""])[0], headers.get("Content-Range"), body)
+        match = PERMISSION_PATH.match(parsed.path)
+        if method == "POST" and match:
+            return self.create_permission(match.group(1))
+        return 404, {"error": {"code": 404, "message": f"No fake for {method} {parsed.path}"}}
+
+
+def parse_mime(content_type, body):
+    """Parse a multipart body given its Content-Type header."""
+    return BytesParser().parsebytes(
+        b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body
+    )
+
+
+def parse_multipart_upload(content_type, body):
+    """Split a multipart/related upload into (metadata, content bytes)."""
+    parts = parse_mime(content_type, body).get_payload()
+    metadata = json.loads(parts[0].get_payload(decode=True) or b"{}")
+    content = (parts[1].get_payload(decode=True) or b"") if len(parts) > 1 else b""
+    return metadata, content
+
+
+def parse_inner_request(data):
+    """Parse one application/http part of a batch request."""
+    head, _, body = data.partition(b"\r\n\r\n")
+    if not body and b"\n\n" in data:
+        head, _, body = data.partition(b"\n\n")
+    lines = head.decode().splitlines()
+    method, url = lines[0].split()[:2]
+    headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+    return method, url, headers, body
+
+
+class Handler(BaseHTTPRequestHandler):
+    drive = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        self._send_json(*self.drive.dispatch("GET", self.path, self.headers, b""))
+
+    def do_POST(self):
+        body = self._body()
+        if urlparse(self.path).path == "/batch/drive/v3":
+            return self._batch(body)
+        self._send_json(*self.drive.dispatch("POST", self.path, self.headers, body))
+
+    def do_PUT(self):
+        self._send_json(*self.drive.dispatch("PUT", self.path, self.headers, self._body()))
+
+    def _batch(self, body):
+        boundary = f"batch_{uuid.uuid4().hex}"
+        chunks = []
+        for part in parse_mime(self.headers["Content-Type"], body).get_payload():
+            method, url, headers, inner_body = parse_inner_request(part.get_payload(decode=True))
+            status, payload = self.drive.dispatch(method, url, headers, inner_body)[:2]
+            # Long Content-ID headers arrive folded over two lines
+            content_id = " ".join(part["Content-ID"].split()).strip("<>")
+            data = json.dumps(payload)
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n"
+                f"{data}\r\n"
+            )
+        data = ("".join(chunks) + f"--{boundary}--\r\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/mixed; boundary={boundary}")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(port=0, fail_rate=0.0, latency=0.0, uplink=None):
+    """Start a fake Drive server on a background thread.
+
+    Returns (server, drive); the server's base URL is
+    f"http://127.0.0.1:{server.server_port}".
+    """
+    drive = FakeDrive(fail_rate, latency, uplink)
+    handler = type("FakeDriveHandler", (Handler,), {"drive": drive})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, drive
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Google Drive API server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="Fraction of calls answered with 503 or 403 rate-limit errors")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every call")
+    parser.add_argument("--uplink", type=float, help="Upload bandwidth in bytes/sec (default: unlimited)")
+    args = parser.parse_args()
+    server, drive = serve(args.port, args.fail_rate, args.latency, args.uplink)
+    print(f"Fake Drive listening on http://127.0.0.1:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
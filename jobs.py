@@ -0,0 +1,101 @@
+"""Background job queue for work that must not block the Tk event loop.
+
+Jobs run on worker threads and report back through an event queue that
+the GUI drains from its own loop with after(), so Tk widgets are only
+ever touched on the Tk thread.
+"""
+import itertools
+import queue
+import threading
+
+QUEUED = "queued"
+STARTED = "started"
+PROGRESS = "progress"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    """Run submitted calls on worker threads and report their progress.
+
+    Every job produces a series of (kind, job_id, value) events on
+    self.events: QUEUED with the job label, STARTED, any number of
+    PROGRESS events with whatever the job passed to its progress
+    callback, and finally DONE with the return value or FAILED with the
+    exception.
+
+    The Google API client is not thread-safe, so jobs that share one
+    Drive service should use a single worker; they still run off the Tk
+    thread and queue up behind each other.
+    """
+
+    def __init__(self, workers=1):
+        self.events = queue.Queue()
+        self._jobs = queue.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._in_flight = 0
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def pending(self):
+        """Jobs waiting for a worker."""
+        return self._pending
+
+    @property
+    def in_flight(self):
+        """Jobs currently running."""
+        return self._in_flight
+
+    def submit(self, fn, *args, label="", **kwargs):
+        """Queue fn(*args, progress=callback, **kwargs) and return its job ID."""
+        job_id = next(self._ids)
+        with self._lock:
+            self._pending += 1
+        self.events.put((QUEUED, job_id, label))
+        self._jobs.put((job_id, fn, args, kwargs))
+        return job_id
+
+    def _worker(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            job_id, fn, args, kwargs = job
+            with self._lock:
+                self._pending -= 1
+                self._in_flight += 1
+            self.events.put((STARTED, job_id, None))
+            progress = lambda value, job_id=job_id: self.events.put((PROGRESS, job_id, value))
+            try:
+                result = fn(*args, progress=progress, **kwargs)
+            except Exception as e:
+                self.events.put((FAILED, job_id, e))
+            else:
+                self.events.put((DONE, job_id, result))
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+    def poll(self):
+        """Return all events queued so far, without blocking."""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def close(self, wait=True):
+        """Stop the workers once the queued jobs have run."""
+        for _ in self._threads:
+            self._jobs.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,106 @@
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+DEFAULT_JOURNAL_PATH = "certificates/journal.db"
+
+# Stages in the order a certificate passes through them
+RESERVED = "reserved"
+RENDERED = "rendered"
+UPLOADED = "uploaded"
+PUBLIC = "public"
+STAGES = (RESERVED, RENDERED, UPLOADED, PUBLIC)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    cert_id TEXT PRIMARY KEY,
+    data_hash TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    drive_link TEXT NOT NULL,
+    pdf_path TEXT NOT NULL,
+    qr_data TEXT NOT NULL,
+    error TEXT,
+    updated_at TEXT NOT NULL
+);
+"""
+
+
+def data_hash(certificate_data):
+    """Hash of the certificate fields, ignoring the Drive link added during issuance."""
+    fields = {k: v for k, v in certificate_data.items() if k != 'drive_link'}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class Journal:
+    """Write-ahead record of how far each certificate got through issuance.
+
+    A certificate's reserved Drive file ID, PDF path and QR payload are
+    written before any work starts, and its stage is advanced as it is
+    rendered, uploaded and made public. A re-run of the same roster
+    reads this back, skipping finished certificates and resuming the
+    others under the same file ID, so no duplicate Drive files appear.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # FULL so that an acknowledged stage survives a power cut
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(SCHEMA)
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.now().isoformat(timespec="seconds")
+
+    def get(self, cert_id, certificate_data=None):
+        """Return the journal entry for a Certificate ID, or None.
+
+        With certificate_data, an entry recorded for different field
+        values is treated as absent, so an edited row is issued afresh.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE cert_id = ?", (cert_id,)).fetchone()
+        if row is None:
+            return None
+        if certificate_data is not None and row['data_hash'] != data_hash(certificate_data):
+            return None
+        return dict(row)
+
+    def reserve(self, cert_id, certificate_data, file_id, drive_link, pdf_path, qr_data):
+        """Record a certificate before any of its work starts."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs "
+                "(cert_id, data_hash, stage, file_id, drive_link, pdf_path, qr_data, error, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?)",
+                (cert_id, data_hash(certificate_data), RESERVED, file_id, drive_link, pdf_path, qr_data,
+                 self._now())
+            )
+
+    def advance(self, cert_ids, stage):
+        """Move certificates to stage, clearing any recorded error."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE jobs SET stage = ?, error = NULL, updated_at = ? WHERE cert_id = ?",
+                [(stage, self._now(), cert_id) for cert_id in cert_ids]
+            )
+
+    def fail(self, cert_id, error):
+        """Note the last error of a certificate without changing its stage."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET error = ?, updated_at = ? WHERE cert_id = ?",
+                               (str(error), self._now(), cert_id))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,18 +1,256 @@
-import os
-from gui_app import VaccineCertApp
-from certificate_manager import CertificateManager
-
-def main():
-    # Configuration
-    CREDENTIALS_PATH = r""  # Update this path
-    FOLDER_ID = ""  # Update this ID
-    
-    # Initialize certificate manager
-    cert_manager = CertificateManager(CREDENTIALS_PATH, FOLDER_ID)
-    
-    # Create and run GUI application
-    app = VaccineCertApp(cert_manager)
-    app.mainloop()
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+import time
+STARTED = time.perf_counter()
+import argparse
+import datetime
+import os
+import subprocess
+import sys
+import threading
+from certificate_manager import PDF_PROFILES, CertificateManager, format_timings
+from metrics import METRICS
+from registry import DEFAULT_REGISTRY_PATH, CertificateRegistry, format_record
+from render_cache import DEFAULT_CACHE_DIR, RenderCache
+from retention import apply_retention
+from upload_state import DEFAULT_SESSIONS_PATH, UPLOAD_LIMITER, UploadSessions
+from verifier import (DEFAULT_KEY_PATH, VALID, Verifier, format_result, load_or_create_signing_key,
+                      load_signing_key)
+
+# Modules on the path to the first window, then the ones loaded lazily
+STARTUP_MODULES = ["certificate_manager", "registry", "verifier", "gui_app", "tkcalendar", "PIL.ImageTk"]
+DEFERRED_MODULES = ["certificate_template", "reportlab.pdfgen.canvas", "qrcode", "drive_uploader",
+                    "googleapiclient.discovery", "scanner", "cv2"]
+
+def import_times(modules):
+    """Return the cold import time of each module in seconds, via python -X importtime."""
+    times = {}
+    here = os.path.dirname(os.path.abspath(__file__))
+    for module in modules:
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              capture_output=True, text=True, cwd=here)
+        for line in proc.stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == module:
+                times[module] = int(parts[1]) / 1e6
+    return times
+
+def print_startup_profile(phases):
+    """Print startup phase timings and a per-module import breakdown."""
+    print(f"Startup phases: {format_timings(phases)}")
+    for title, modules in (("Loaded at startup", STARTUP_MODULES), ("Loaded on first use", DEFERRED_MODULES)):
+        print(f"{title} (cold import, each in a fresh interpreter):")
+        for module, seconds in import_times(modules).items():
+            print(f"  {module:<28}{seconds * 1000:8.1f} ms")
+
+def lookup(registry, args):
+    """Print registry records matching the lookup arguments."""
+    for field in ("cert_id", "passport", "nid", "mobile"):
+        value = getattr(args, field)
+        if value:
+            records = registry.find(**{field: value})
+            break
+    for record in records:
+        print(format_record(record))
+    if not records:
+        print("No matching certificate found.")
+    return 0 if records else 1
+
+def print_group(registry, args):
+    """Render registry records as one multi-page PDF, optionally split per person."""
+    cert_ids = list(args.cert_ids)
+    if args.roster:
+        from roster_import import read_cert_ids
+        cert_ids += read_cert_ids(args.roster)
+    entries = []
+    for cert_id in cert_ids:
+        record = registry.get(cert_id)
+        if record is None:
+            print(f"No certificate with ID {cert_id}.")
+            return 1
+        entries.append((record['data'], record['qr_data'] or record['drive_link']))
+    if not entries:
+        print("No certificates given.")
+        return 1
+    output = args.output or f"certificates/Group_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    from certificate_template import template_for
+    result = CertificateManager.generate_group_pdf(entries, output, split_dir=args.split,
+                                                   template=template_for(args.pdf_profile))
+    print(f"{result['pages']} pages written to {result['pdf_path']} ({format_timings(result['timings'])})")
+    for path in result['split_paths']:
+        print(f"  {path}")
+    return 0
+
+def main(argv=None):
+    # Configuration
+    CREDENTIALS_PATH = r""  # Update this path
+    FOLDER_ID = ""  # Update this ID
+    
+    parser = argparse.ArgumentParser(description="Vaccine Certification System")
+    parser.add_argument("--qr-format", choices=["link", "compact"], default="link",
+                        help="Encode the Drive link, or the certificate fields in compact form")
+    parser.add_argument("--scan-source", default="0",
+                        help="Camera index, or a recorded video file to scan instead of a camera")
+    parser.add_argument("--dedupe-window", type=float, default=5.0,
+                        help="Seconds during which continuous scanning ignores a repeated QR code")
+    parser.add_argument("--registry", default=DEFAULT_REGISTRY_PATH,
+                        help="SQLite registry of issued certificates")
+    parser.add_argument("--signing-key", default=DEFAULT_KEY_PATH,
+                        help="HMAC key for signing and verifying compact QR payloads "
+                             "(created if missing when issuing; other commands need a copy)")
+    parser.add_argument("--pdf-profile", choices=PDF_PROFILES, default="compact",
+                        help="compact: smallest files; archival: PDF/A-2b via Ghostscript; "
+                             "legacy: ReportLab defaults and an image QR code, as before")
+    parser.add_argument("--render-cache", default=DEFAULT_CACHE_DIR,
+                        help="Cache of issued PDFs reused for unchanged certificates ('' to disable)")
+    parser.add_argument("--upload-limit", type=float, metavar="KB_PER_SEC",
+                        help="Cap the combined Drive upload bandwidth (default: unlimited)")
+    parser.add_argument("--upload-chunk", type=int, default=1024, metavar="KB",
+                        help="Chunk size of resumable uploads, a multiple of 256 (default: %(default)s); "
+                             "larger files resume after a dropped connection or restart")
+    parser.add_argument("--keep-days", type=float,
+                        help="Delete local PDFs this many days old once they are confirmed on Drive "
+                             "(default: keep them; see retention.py)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print how long startup took and an import-time breakdown")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-file",
+                        help="Write Prometheus metrics to this file (for a textfile collector)")
+    parser.add_argument("--metrics-log", help="Append structured JSON events to this file")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    batch_parser = subparsers.add_parser("batch", help="Issue certificates for a CSV/JSONL roster")
+    batch_parser.add_argument("roster", help="Path to a .csv, .jsonl or .xlsx roster file")
+    batch_parser.add_argument("--rejects", help="CSV for rows that fail validation "
+                                                "(default: certificates/rejects_<timestamp>.csv)")
+    batch_parser.add_argument("--workers", type=int, default=None,
+                              help="Render processes (default: number of cores)")
+    batch_parser.add_argument("--journal", default="certificates/journal.db",
+                              help="Job journal that lets an interrupted batch resume (default: %(default)s)")
+    batch_parser.add_argument("--no-journal", action="store_true",
+                              help="Issue every row afresh without recording progress")
+    
+    lookup_parser = subparsers.add_parser("lookup", help="Find issued certificates and their Drive links")
+    lookup_group = lookup_parser.add_mutually_exclusive_group(required=True)
+    lookup_group.add_argument("--id", dest="cert_id", help="Certificate ID")
+    lookup_group.add_argument("--passport")
+    lookup_group.add_argument("--nid")
+    lookup_group.add_argument("--mobile")
+    
+    reprint_parser = subparsers.add_parser("reprint", help="Get a local PDF of an issued certificate")
+    reprint_parser.add_argument("cert_id", help="Certificate ID")
+    
+    revoke_parser = subparsers.add_parser("revoke", help="Mark an issued certificate as revoked")
+    revoke_parser.add_argument("cert_id", help="Certificate ID")
+    revoke_parser.add_argument("--reason", default="", help="Recorded with the revocation")
+    
+    group_parser = subparsers.add_parser("print-group",
+                                         help="Render issued certificates as pages of one PDF for printing")
+    group_parser.add_argument("cert_ids", nargs="*", help="Certificate IDs, in page order")
+    group_parser.add_argument("--roster", help="Take the Certificate IDs from a CSV, JSONL or Excel roster")
+    group_parser.add_argument("--output", help="Group PDF path (default: certificates/Group_<timestamp>.pdf)")
+    group_parser.add_argument("--split", metavar="DIR",
+                              help="Also write one PDF per person here, split from the same render")
+    
+    verify_parser = subparsers.add_parser("verify", help="Check scanned QR text offline")
+    verify_parser.add_argument("qr_text", help="Decoded QR code contents")
+    args = parser.parse_args(argv)
+    phases = {'imports': time.perf_counter() - STARTED}
+    
+    start = time.perf_counter()
+    registry = CertificateRegistry(args.registry)
+    render_cache = RenderCache(args.render_cache) if args.render_cache else None
+    phases['registry'] = time.perf_counter() - start
+    
+    # Registry commands work offline, without Drive credentials
+    if args.command == "lookup":
+        return lookup(registry, args)
+    if args.command == "reprint":
+        record = registry.get(args.cert_id)
+        if record is None:
+            print(f"No certificate with ID {args.cert_id}.")
+            return 1
+        from certificate_template import template_for
+        print(CertificateManager.reprint(record, cache=render_cache, template=template_for(args.pdf_profile)))
+        return 0
+    if args.command == "revoke":
+        if not registry.revoke(args.cert_id, args.reason):
+            print(f"No certificate with ID {args.cert_id}.")
+            return 1
+        print(f"Revoked {args.cert_id}.")
+        return 0
+    if args.command == "print-group":
+        return print_group(registry, args)
+    if args.command == "verify":
+        try:
+            verifier = Verifier(registry, load_signing_key(args.signing_key))
+        except OSError as e:
+            print(e)
+            return 1
+        result = verifier.verify(args.qr_text)
+        print(format_result(result))
+        return 0 if result.status == VALID else 1
+    
+    # Initialize certificate manager; the Drive client is built on first use
+    start = time.perf_counter()
+    # Only the issuing machine creates the signing key
+    signing_key = load_or_create_signing_key(args.signing_key)
+    if args.upload_chunk % 256:
+        parser.error("--upload-chunk must be a multiple of 256")
+    if args.upload_limit:
+        UPLOAD_LIMITER.configure(args.upload_limit * 1024)
+    cert_manager = CertificateManager(CREDENTIALS_PATH, FOLDER_ID, qr_format=args.qr_format,
+                                      registry=registry, signing_key=signing_key, render_cache=render_cache,
+                                      pdf_profile=args.pdf_profile, chunk_size=args.upload_chunk * 1024,
+                                      upload_sessions=UploadSessions(DEFAULT_SESSIONS_PATH))
+    phases['manager'] = time.perf_counter() - start
+    
+    METRICS.log_path = args.metrics_log
+    if args.metrics_port:
+        METRICS.serve(args.metrics_port)
+    if args.metrics_file:
+        METRICS.write_periodically(args.metrics_file)
+    
+    if args.command == "batch":
+        from batch import BatchIssuer
+        from journal import Journal
+        from roster_import import RejectsWriter, import_roster
+        rejects = RejectsWriter(args.rejects or
+                                f"certificates/rejects_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+        journal = None if args.no_journal else Journal(args.journal)
+        try:
+            issuer = BatchIssuer(cert_manager, workers=args.workers, journal=journal)
+            summary = issuer.run(import_roster(args.roster, rejects))
+        finally:
+            rejects.close()
+            if journal is not None:
+                journal.close()
+        if rejects.count:
+            print(f"{rejects.count} rows rejected, see {rejects.path}")
+        if args.metrics_file:
+            METRICS.write_prometheus(args.metrics_file)
+        apply_retention(registry=registry, keep_days=args.keep_days, render_cache=render_cache)
+        return 1 if summary['failed'] or rejects.count else 0
+    
+    # Create and run GUI application
+    start = time.perf_counter()
+    from gui_app import VaccineCertApp
+    phases['gui_import'] = time.perf_counter() - start
+    start = time.perf_counter()
+    scan_source = int(args.scan_source) if args.scan_source.isdigit() else args.scan_source
+    app = VaccineCertApp(cert_manager, scan_source=scan_source, dedupe_window=args.dedupe_window,
+                         verifier=Verifier(registry, signing_key))
+    app.update()
+    phases['window'] = time.perf_counter() - start
+    if args.profile_startup:
+        print_startup_profile(phases)
+    # Load scanning, rendering and Drive dependencies while the operator types
+    app.warm_up()
+    threading.Thread(target=apply_retention, name="retention", daemon=True,
+                     kwargs={'registry': registry, 'keep_days': args.keep_days, 'render_cache': render_cache}).start()
+    app.mainloop()
+    if args.metrics_file:
+        METRICS.write_prometheus(args.metrics_file)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
\ No newline at end of file
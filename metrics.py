@@ -0,0 +1,191 @@
+"""Process-wide timing histograms and counters for issuance and scanning.
+
+Everything is recorded on the shared METRICS instance. It can be
+exported in the Prometheus text format, either served over HTTP
+(serve()) or written to a file for a textfile collector
+(write_prometheus()). Notable events (issued and failed certificates,
+scans) can also go to a JSON Lines log.
+"""
+import datetime
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "vaccine_cert_"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name: (type, help)
+METRICS_HELP = {
+    'stage_seconds': ("histogram", "Duration of each issuance pipeline stage"),
+    'operation_seconds': ("histogram", "Duration of CertificateManager operations"),
+    'scan_decode_seconds': ("histogram", "Duration of one QR decode attempt on a frame"),
+    'scan_frame_seconds': ("histogram", "Time spent on one camera frame, by how it was handled"),
+    'certificates_issued_total': ("counter", "Certificates issued"),
+    'certificate_failures_total': ("counter", "Certificates that failed to issue"),
+    'uploads_total': ("counter", "Files uploaded to Drive"),
+    'upload_failures_total': ("counter", "Drive uploads that failed after retries"),
+    'upload_resumes_total': ("counter", "Resumable uploads continued from a saved session"),
+    'drive_retries_total': ("counter", "Drive API calls retried after a transient error"),
+    'bytes_written_total': ("counter", "PDF bytes written, by destination"),
+    'scan_frames_total': ("counter", "Camera frames, by outcome (roi, full, gated, skipped or dropped)"),
+    'scans_total': ("counter", "QR codes reported by the scanner, by outcome"),
+    'render_cache_total': ("counter", "Render cache lookups, by outcome"),
+    'render_cache_evictions_total': ("counter", "Render cache entries evicted"),
+}
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics:
+    """Thread-safe registry of labelled histograms and counters."""
+
+    def __init__(self, log_path=None):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self.log_path = log_path
+
+    def observe(self, name, seconds, **labels):
+        """Add a duration to the histogram name{labels}."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        """Increase the counter name{labels}."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Observe the duration of the with-block into name{labels}."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def log(self, event, **fields):
+        """Append a structured event to the JSON Lines log, if one is set."""
+        if not self.log_path:
+            return
+        entry = {"time": datetime.datetime.now().isoformat(timespec="milliseconds"), "event": event}
+        entry.update(fields)
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def snapshot(self):
+        """Return the current values as a JSON-serialisable dict."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {"name": name, "labels": dict(labels), "count": h.count, "sum": h.sum,
+                 "buckets": dict(zip(map(str, h.buckets), h.counts))}
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def prometheus_text(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        described = set()
+        with self._lock:
+            series = sorted(list(self._counters.items()) + list(self._histograms.items()),
+                            key=lambda item: item[0])
+            for (name, labels), value in series:
+                full_name = PREFIX + name
+                if name not in described:
+                    described.add(name)
+                    kind, text = METRICS_HELP.get(name, ("untyped", name))
+                    lines.append(f"# HELP {full_name} {text}")
+                    lines.append(f"# TYPE {full_name} {kind}")
+                if not isinstance(value, Histogram):
+                    lines.append(f"{full_name}{_label_text(labels)} {value}")
+                    continue
+                for bound, count in zip(value.buckets, value.counts):
+                    lines.append(f"{full_name}_bucket{_label_text(labels + (('le', bound),))} {count}")
+                lines.append(f"{full_name}_bucket{_label_text(labels + (('le', '+Inf'),))} {value.count}")
+                lines.append(f"{full_name}_sum{_label_text(labels)} {value.sum}")
+                lines.append(f"{full_name}_count{_label_text(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomically write the Prometheus text to path."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def write_periodically(self, path, interval=15.0):
+        """Rewrite the Prometheus file every interval seconds on a daemon thread."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.write_prometheus(path)
+        threading.Thread(target=loop, name="metrics-writer", daemon=True).start()
+
+    def serve(self, port=9464, host="127.0.0.1"):
+        """Serve /metrics (Prometheus text) and /metrics.json on a daemon thread."""
+        # Imported here as http.server is slow to load and rarely needed
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.prometheus_text(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+
+METRICS = Metrics()
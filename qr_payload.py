@@ -0,0 +1,162 @@
+"""Compact QR payload for vaccine certificates.
+
+The payload is "VC:" followed by the base45 encoding (RFC 9285) of a
+one-byte header and the field values in a fixed order, zlib-compressed
+when that is shorter. Field names are implied by their position, and
+every character is in the QR alphanumeric set, so the code stays at a
+small QR version compared to a JSON dump of the certificate.
+
+Signed payloads put a truncated HMAC-SHA256 of the header and body
+between the two, so a scanner holding the key can check authenticity
+offline.
+"""
+import hashlib
+import hmac
+import zlib
+
+PAYLOAD_PREFIX = "VC:"
+PAYLOAD_VERSION = 1
+
+FLAG_COMPRESSED = 0x10
+FLAG_SIGNED = 0x20
+VERSION_MASK = 0x0F
+SIGNATURE_SIZE = 16
+
+FIELD_SEPARATOR = "\x1f"
+
+# Field order of version 1 payloads. Never reorder; append and bump
+# PAYLOAD_VERSION instead.
+PAYLOAD_FIELDS = {
+    1: [
+        'Certificate ID',
+        'Full Name',
+        'Passport',
+        'NID',
+        'Vaccine Name',
+        'Dose Information',
+        'Date',
+        'Batch',
+        'drive_file_id',
+    ],
+}
+
+BASE45_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+BASE45_VALUES = {c: i for i, c in enumerate(BASE45_ALPHABET)}
+
+
+def base45_encode(data):
+    """Encode bytes as a base45 string."""
+    out = []
+    for i in range(0, len(data) - 1, 2):
+        n = data[i] * 256 + data[i + 1]
+        n, c = divmod(n, 45)
+        e, d = divmod(n, 45)
+        out.append(BASE45_ALPHABET[c] + BASE45_ALPHABET[d] + BASE45_ALPHABET[e])
+    if len(data) % 2:
+        d, c = divmod(data[-1], 45)
+        out.append(BASE45_ALPHABET[c] + BASE45_ALPHABET[d])
+    return "".join(out)
+
+
+def base45_decode(text):
+    """Decode a base45 string to bytes."""
+    try:
+        values = [BASE45_VALUES[c] for c in text]
+    except KeyError as e:
+        raise ValueError(f"Invalid base45 character {e}") from None
+    out = bytearray()
+    for i in range(0, len(values), 3):
+        chunk = values[i:i + 3]
+        if len(chunk) == 3:
+            n = chunk[0] + chunk[1] * 45 + chunk[2] * 45 * 45
+            if n > 0xFFFF:
+                raise ValueError("Invalid base45 triplet")
+            out.extend(divmod(n, 256))
+        elif len(chunk) == 2:
+            n = chunk[0] + chunk[1] * 45
+            if n > 0xFF:
+                raise ValueError("Invalid base45 pair")
+            out.append(n)
+        else:
+            raise ValueError("Invalid base45 length")
+    return bytes(out)
+
+
+def is_compact_payload(text):
+    """Return True if text looks like a compact certificate payload."""
+    return text.startswith(PAYLOAD_PREFIX)
+
+
+def sign(key, header, body):
+    """Return the truncated HMAC-SHA256 signature of a payload."""
+    return hmac.new(key, bytes([header]) + body, hashlib.sha256).digest()[:SIGNATURE_SIZE]
+
+
+def encode_payload(certificate_data, file_id=None, version=PAYLOAD_VERSION, signing_key=None):
+    """Encode certificate fields (and the Drive file ID) as a QR payload.
+
+    With signing_key (bytes) the payload carries an HMAC signature.
+    """
+    values = dict(certificate_data)
+    if file_id:
+        values['drive_file_id'] = file_id
+    body = FIELD_SEPARATOR.join(
+        str(values.get(field, '')).replace(FIELD_SEPARATOR, ' ') for field in PAYLOAD_FIELDS[version]
+    ).encode("utf-8")
+    header = version
+    compressed = zlib.compress(body, 9)
+    if len(compressed) < len(body):
+        body = compressed
+        header |= FLAG_COMPRESSED
+    signature = b""
+    if signing_key:
+        header |= FLAG_SIGNED
+        signature = sign(signing_key, header, body)
+    return PAYLOAD_PREFIX + base45_encode(bytes([header]) + signature + body)
+
+
+def unpack_payload(text):
+    """Split a compact payload into (header, signature, body) bytes.
+
+    signature is None for unsigned payloads. Raises ValueError if the
+    text is not a well-formed payload.
+    """
+    if not is_compact_payload(text):
+        raise ValueError("Not a compact certificate payload")
+    raw = base45_decode(text[len(PAYLOAD_PREFIX):])
+    if not raw:
+        raise ValueError("Empty payload")
+    header, rest = raw[0], raw[1:]
+    if not header & FLAG_SIGNED:
+        return header, None, rest
+    if len(rest) < SIGNATURE_SIZE:
+        raise ValueError("Truncated signature")
+    return header, rest[:SIGNATURE_SIZE], rest[SIGNATURE_SIZE:]
+
+
+def verify_signature(text, key):
+    """Return True if the payload is signed and the signature matches key."""
+    header, signature, body = unpack_payload(text)
+    return signature is not None and hmac.compare_digest(signature, sign(key, header, body))
+
+
+def decode_payload(text):
+    """Decode a compact payload back into a certificate dict.
+
+    The signature, if any, is not checked here; see verify_signature.
+    Raises ValueError if the text is not a valid payload.
+    """
+    header, _, body = unpack_payload(text)
+    version = header & VERSION_MASK
+    if version not in PAYLOAD_FIELDS:
+        raise ValueError(f"Unsupported payload version {version}")
+    if header & FLAG_COMPRESSED:
+        try:
+            body = zlib.decompress(body)
+        except zlib.error as e:
+            raise ValueError(f"Corrupt payload: {e}") from None
+    values = body.decode("utf-8").split(FIELD_SEPARATOR)
+    fields = PAYLOAD_FIELDS[version]
+    if len(values) != len(fields):
+        raise ValueError("Payload field count does not match its version")
+    return dict(zip(fields, values))
@@ -0,0 +1,82 @@
+"""QR codes drawn straight from the module matrix.
+
+qrcode's make_image paints every module through PIL at box_size pixels,
+and the GUI used to save that to PNG, read it back and resample it for
+display. A QRRaster holds the matrix once, as a NumPy array, and gives:
+
+- image(): the same black-and-white PIL image, scaled up with np.repeat;
+- preview(size): an image of exactly size x size pixels for the GUI,
+  with whole pixels per module and no resampling;
+- draw(canvas, x, y, size): the dark modules as filled rectangles in a
+  PDF, so the certificate holds no raster image at all.
+"""
+import numpy as np
+from PIL import Image
+
+
+class QRRaster:
+    """The modules of one QR code, quiet zone included; True is dark."""
+
+    def __init__(self, modules, version=None):
+        self.modules = np.asarray(modules, dtype=bool)
+        self.version = version
+
+    @classmethod
+    def from_qr(cls, qr):
+        """Build from a qrcode.QRCode on which make() has been called."""
+        return cls(qr.get_matrix(), qr.version)
+
+    @property
+    def width(self):
+        """Width in modules."""
+        return self.modules.shape[0]
+
+    def raster(self, box_size=10):
+        """Return a boolean array with box_size pixels per module; True is light."""
+        return np.repeat(np.repeat(~self.modules, box_size, axis=0), box_size, axis=1)
+
+    def image(self, box_size=10):
+        """Return a mode "1" PIL image, as qrcode's make_image would."""
+        return Image.fromarray(self.raster(box_size))
+
+    def save(self, path, box_size=10):
+        self.image(box_size).save(path)
+        return path
+
+    def preview(self, size):
+        """Return a size x size grayscale image for display.
+
+        Each module gets the same whole number of pixels and what is left
+        over widens the quiet zone, so edges stay sharp at any size.
+        """
+        box_size = size // self.width
+        if box_size == 0:
+            # Smaller than one pixel per module: pick the nearest module
+            index = np.arange(size) * self.width // size
+            light = ~self.modules[np.ix_(index, index)]
+        else:
+            light = self.raster(box_size)
+            pad = size - light.shape[0]
+            light = np.pad(light, (pad // 2, pad - pad // 2), constant_values=True)
+        return Image.fromarray(light.astype(np.uint8) * 255, mode="L")
+
+    def runs(self):
+        """Yield (row, first column, length) for each horizontal run of dark modules."""
+        # Column indices where a row switches between light and dark
+        padded = np.zeros((self.width, self.width + 2), dtype=np.int8)
+        padded[:, 1:-1] = self.modules
+        rows, columns = np.nonzero(np.diff(padded, axis=1))
+        for row, start, end in zip(rows[::2], columns[::2], columns[1::2]):
+            yield int(row), int(start), int(end - start)
+
+    def draw(self, c, x, y, size):
+        """Draw the code onto ReportLab canvas c with its lower left corner at (x, y)."""
+        module = size / self.width
+        top = y + size
+        path = c.beginPath()
+        for row, column, length in self.runs():
+            path.rect(x + column * module, top - (row + 1) * module, length * module, module)
+        c.saveState()
+        c.setFillColorRGB(0, 0, 0)
+        c.drawPath(path, stroke=0, fill=1)
+        c.restoreState()
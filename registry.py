@@ -0,0 +1,195 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+DEFAULT_REGISTRY_PATH = "certificates/registry.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS certificates (
+    cert_id TEXT PRIMARY KEY,
+    full_name TEXT,
+    passport TEXT,
+    nid TEXT,
+    mobile TEXT,
+    drive_file_id TEXT,
+    drive_link TEXT,
+    pdf_path TEXT,
+    qr_data TEXT,
+    issued_at TEXT NOT NULL,
+    revoked_at TEXT,
+    revoked_reason TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_certificates_passport ON certificates (passport);
+CREATE INDEX IF NOT EXISTS idx_certificates_nid ON certificates (nid);
+CREATE INDEX IF NOT EXISTS idx_certificates_mobile ON certificates (mobile);
+CREATE INDEX IF NOT EXISTS idx_certificates_drive_file_id ON certificates (drive_file_id);
+"""
+
+LOOKUP_COLUMNS = {
+    'cert_id': 'cert_id',
+    'passport': 'passport',
+    'nid': 'nid',
+    'mobile': 'mobile',
+    'drive_file_id': 'drive_file_id',
+}
+
+
+class CertificateRegistry:
+    """Persistent index of issued certificates.
+
+    Backed by SQLite with indexes on Certificate ID (the primary key),
+    Passport, NID, Mobile and Drive file ID, so lookups stay in the
+    millisecond range with hundreds of thousands of rows. One connection
+    is shared between threads behind a lock.
+    """
+
+    def __init__(self, path=DEFAULT_REGISTRY_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        # Registries created before revocation support lack these columns
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(certificates)")}
+        with self._conn:
+            for column in ("revoked_at", "revoked_reason"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE certificates ADD COLUMN {column} TEXT")
+            # For changes_since(); created here as revoked_at may have just been added
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_certificates_issued_at ON certificates (issued_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_certificates_revoked_at ON certificates (revoked_at)")
+
+    @staticmethod
+    def _row_values(certificate_data, file_id=None, drive_link=None, pdf_path=None, qr_data=None):
+        return (
+            certificate_data.get('Certificate ID', 'unknown'),
+            certificate_data.get('Full Name'),
+            certificate_data.get('Passport'),
+            certificate_data.get('NID'),
+            certificate_data.get('Mobile'),
+            file_id,
+            drive_link or certificate_data.get('drive_link'),
+            pdf_path,
+            qr_data,
+            datetime.datetime.now().isoformat(timespec="seconds"),
+            json.dumps(certificate_data),
+        )
+
+    def record(self, certificate_data, file_id=None, drive_link=None, pdf_path=None, qr_data=None):
+        """Store an issued certificate, replacing an earlier issue of the same ID."""
+        self.record_many([(certificate_data, file_id, drive_link, pdf_path, qr_data)])
+
+    def record_many(self, entries):
+        """Store several (certificate_data, file_id, drive_link, pdf_path, qr_data) entries in one transaction.
+
+        Re-issuing a Certificate ID replaces its record and clears any
+        revocation: the new certificate is valid, while QR codes of the
+        earlier issue name a Drive file the record no longer points at and
+        fail verification (see verifier.Verifier).
+        """
+        rows = [self._row_values(*entry) for entry in entries]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO certificates "
+                "(cert_id, full_name, passport, nid, mobile, drive_file_id, drive_link, pdf_path, qr_data, issued_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(cert_id) DO UPDATE SET full_name = excluded.full_name, passport = excluded.passport, "
+                "nid = excluded.nid, mobile = excluded.mobile, drive_file_id = excluded.drive_file_id, "
+                "drive_link = excluded.drive_link, pdf_path = excluded.pdf_path, qr_data = excluded.qr_data, "
+                "issued_at = excluded.issued_at, data = excluded.data, revoked_at = NULL, revoked_reason = NULL",
+                rows
+            )
+
+    @staticmethod
+    def _to_dict(row):
+        record = dict(row)
+        record['data'] = json.loads(record['data'])
+        return record
+
+    def get(self, cert_id):
+        """Return the record for a Certificate ID, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM certificates WHERE cert_id = ?", (cert_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def find(self, **criteria):
+        """Return records matching one indexed field, e.g. find(passport="A123")."""
+        if len(criteria) != 1:
+            raise ValueError("find() takes exactly one of: " + ", ".join(LOOKUP_COLUMNS))
+        (field, value), = criteria.items()
+        if field not in LOOKUP_COLUMNS:
+            raise ValueError(f"Cannot look up certificates by {field!r}")
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM certificates WHERE {LOOKUP_COLUMNS[field]} = ? ORDER BY issued_at DESC",
+                (value,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def revoke(self, cert_id, reason=""):
+        """Mark a certificate as revoked; returns False if the ID is unknown."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE certificates SET revoked_at = ?, revoked_reason = ? WHERE cert_id = ?",
+                (datetime.datetime.now().isoformat(timespec="seconds"), reason, cert_id)
+            )
+        return cursor.rowcount > 0
+
+    def changes_since(self, since=None):
+        """Return rows issued or revoked at or after the ISO timestamp since (all rows if None).
+
+        Rows come back as sqlite3.Row with the certificate data left as
+        JSON text, for callers that index many rows and decode few.
+        """
+        with self._lock:
+            if since is None:
+                return self._conn.execute("SELECT * FROM certificates").fetchall()
+            return self._conn.execute(
+                "SELECT * FROM certificates WHERE issued_at >= ? OR revoked_at >= ?", (since, since)
+            ).fetchall()
+
+    def local_pdf_paths(self):
+        """Return the local PDF paths, as recorded, of certificates uploaded and made public."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT pdf_path FROM certificates WHERE pdf_path IS NOT NULL AND drive_file_id IS NOT NULL"
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def move_pdf(self, old_path, new_path):
+        """Point records at a PDF that was moved on disk."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE certificates SET pdf_path = ? WHERE pdf_path = ?", (new_path, old_path))
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM certificates").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def format_record(record):
+    """Format a registry record for the lookup CLI."""
+    lines = [
+        f"{record['cert_id']}  {record['full_name'] or ''}",
+        f"  Passport: {record['passport'] or '-'}  NID: {record['nid'] or '-'}  Mobile: {record['mobile'] or '-'}",
+        f"  Issued: {record['issued_at']}",
+    ]
+    if record['revoked_at']:
+        lines.append(f"  REVOKED: {record['revoked_at']} {record['revoked_reason'] or ''}".rstrip())
+    lines.append(f"  PDF: {record['pdf_path'] or '-'}")
+    lines.append(f"  Drive: {record['drive_link'] or '-'}")
+    return "\n".join(lines)
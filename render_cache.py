@@ -0,0 +1,159 @@
+"""Content-addressed cache of issued certificate PDFs.
+
+Entries are keyed by a hash of the normalized certificate fields, the
+template version and the output asked for (PDF profile, QR format and
+whether the payload is signed), so issuing or reprinting a certificate
+whose details have not changed returns the PDF, QR payload and Drive
+link from the first time instead of rendering and uploading it again.
+Any change to a field or to the output, or a new TEMPLATE_VERSION,
+gives a new key.
+
+Each entry is a PDF and a small JSON file under certificates/cache/,
+sharded by the first two hex digits of the key. The PDF is hard-linked
+to the issued file where possible, so the cache adds no extra disk use.
+Entries unused for max_age are evicted, and the least recently used
+ones beyond max_bytes.
+"""
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+from metrics import METRICS
+from roster_import import normalize_fields
+
+DEFAULT_CACHE_DIR = "certificates/cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE = datetime.timedelta(days=30)
+
+
+def cache_key(certificate_data, profile, qr_format, signed=False):
+    """Return the cache key of a certificate's fields for the current template and an output."""
+    # Imported here as certificate_template pulls in ReportLab
+    from certificate_template import TEMPLATE_VERSION
+    fields = {key: str(value).strip() for key, value in normalize_fields(certificate_data).items()
+              if key != 'drive_link'}
+    text = json.dumps({'template': TEMPLATE_VERSION, 'profile': profile, 'qr_format': qr_format,
+                       'signed': signed, 'fields': fields}, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """PDFs and Drive details of issued certificates, keyed by their content."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # Total size of the cached PDFs, counted on the first put
+        self._size = None
+
+    def _paths(self, key):
+        shard = os.path.join(self.directory, key[:2])
+        return os.path.join(shard, key + ".pdf"), os.path.join(shard, key + ".json")
+
+    def get(self, certificate_data, profile, qr_format, signed=False):
+        """Return the cached entry for certificate_data in an output, or None.
+
+        An entry is a dict with pdf_path, file_id, drive_link, qr_data,
+        qr_format, profile and signed. Hits count as a use for eviction.
+        """
+        pdf_path, meta_path = self._paths(cache_key(certificate_data, profile, qr_format, signed))
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(pdf_path)
+        except (OSError, ValueError):
+            METRICS.inc('render_cache_total', outcome="miss")
+            return None
+        METRICS.inc('render_cache_total', outcome="hit")
+        entry['pdf_path'] = pdf_path
+        return entry
+
+    def put(self, certificate_data, pdf_bytes, file_id, drive_link, qr_data, profile, qr_format, signed=False,
+            source_path=None):
+        """Cache an issued certificate and return the cached PDF path.
+
+        With source_path, the PDF already written there is hard-linked
+        into the cache instead of written a second time.
+        """
+        key = cache_key(certificate_data, profile, qr_format, signed)
+        pdf_path, meta_path = self._paths(key)
+        os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+        tmp_path = pdf_path + ".tmp"
+        try:
+            if source_path is None:
+                raise OSError("no file to link")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            os.link(source_path, tmp_path)
+        except OSError:
+            with open(tmp_path, "wb") as f:
+                f.write(pdf_bytes)
+        os.replace(tmp_path, pdf_path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                'cert_id': certificate_data.get('Certificate ID'),
+                'file_id': file_id,
+                'drive_link': drive_link,
+                'qr_data': qr_data,
+                'qr_format': qr_format,
+                'profile': profile,
+                'signed': signed,
+                'created': datetime.datetime.now().isoformat(timespec="seconds"),
+            }, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+        with self._lock:
+            if self._size is not None:
+                self._size += len(pdf_bytes)
+            over = self._size is None or self._size > self.max_bytes
+        if over:
+            self.evict()
+        return pdf_path
+
+    def entries(self):
+        """Return (key, pdf_path, size, last_used) for every cached PDF."""
+        found = []
+        try:
+            shards = os.scandir(self.directory)
+        except FileNotFoundError:
+            return found
+        with shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if entry.name.endswith(".pdf"):
+                            stat = entry.stat()
+                            found.append((entry.name[:-4], entry.path, stat.st_size, stat.st_mtime))
+        return found
+
+    def evict(self):
+        """Drop entries older than max_age, then the least recently used beyond max_bytes.
+
+        Returns the number of entries removed.
+        """
+        entries = sorted(self.entries(), key=lambda e: e[3])
+        cutoff = time.time() - self.max_age.total_seconds()
+        total = sum(size for _, _, size, _ in entries)
+        removed = 0
+        for key, pdf_path, size, last_used in entries:
+            if last_used >= cutoff and total <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            removed += 1
+        with self._lock:
+            self._size = total
+        if removed:
+            METRICS.inc('render_cache_evictions_total', removed)
+        return removed
@@ -0,0 +1,213 @@
+"""Retention and housekeeping for the certificates/ output directory.
+
+    python retention.py report              # disk usage by kind of file
+    python retention.py sweep               # remove orphaned temporary files
+    python retention.py shard               # file old flat PDFs into day directories
+    python retention.py prune --keep-days 90
+
+New certificates are written to one subdirectory per issue day (see
+certificate_manager.certificate_path); `shard` moves files written
+before that into the same layout and updates the registry. `prune`
+only deletes local PDFs that the registry records as uploaded and made
+public, so nothing that exists only on this machine is lost; a pruned
+certificate can still be reprinted from the registry. The registry,
+journal, signing key and token cache are never touched.
+"""
+import argparse
+import datetime
+import fnmatch
+import os
+import re
+import time
+
+from certificate_manager import certificate_path
+
+OUTPUT_DIR = "certificates"
+# Left behind by interrupted QR/PDF generation and atomic writes
+ORPHAN_PATTERNS = ["temp_qr_*.png", "temp_qr.png", "temp_scanned_qr.png", "*.tmp"]
+# Younger temporary files may belong to an issuance still in progress
+ORPHAN_MIN_AGE = datetime.timedelta(hours=1)
+ISSUED_FILE = re.compile(r"(?P<kind>Vaccine_Certificate|qr)_(?P<cert_id>.+)_(?P<timestamp>\d{8}_\d{6})\.(pdf|png)")
+SHARD_DIR = re.compile(r"\d{8}")
+STATE_SUFFIXES = (".db", ".db-wal", ".db-shm", ".key", ".json", ".jsonl", ".csv", ".prom")
+
+
+def walk_files(directory):
+    """Yield an os.DirEntry for every file below directory."""
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def classify(entry, output_dir=OUTPUT_DIR):
+    """Return the kind of file an entry of the output directory is."""
+    relpath = os.path.relpath(entry.path, output_dir)
+    if relpath.split(os.sep)[0] == "cache":
+        return "cache"
+    if any(fnmatch.fnmatch(entry.name, pattern) for pattern in ORPHAN_PATTERNS):
+        return "temporary"
+    match = ISSUED_FILE.fullmatch(entry.name)
+    if match:
+        return "certificate" if match.group("kind") == "Vaccine_Certificate" else "qr"
+    if entry.name.startswith("Group_") and entry.name.endswith(".pdf"):
+        return "group"
+    if entry.name.endswith(STATE_SUFFIXES):
+        return "state"
+    return "other"
+
+
+def _remove(path, dry_run):
+    if not dry_run:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def sweep_orphans(output_dir=OUTPUT_DIR, min_age=ORPHAN_MIN_AGE, dry_run=False):
+    """Delete orphaned temporary files older than min_age; return their paths."""
+    cutoff = time.time() - min_age.total_seconds()
+    removed = []
+    for entry in walk_files(output_dir):
+        if classify(entry, output_dir) == "temporary" and entry.stat().st_mtime < cutoff:
+            _remove(entry.path, dry_run)
+            removed.append(entry.path)
+    return removed
+
+
+def shard_existing(output_dir=OUTPUT_DIR, registry=None, dry_run=False):
+    """Move certificates and QR images from the top of output_dir into day directories.
+
+    Registry records pointing at a moved PDF are updated. Returns
+    (old_path, new_path) pairs.
+    """
+    moved = []
+    with os.scandir(output_dir) as entries:
+        flat = [entry for entry in entries if entry.is_file() and ISSUED_FILE.fullmatch(entry.name)]
+    for entry in flat:
+        match = ISSUED_FILE.fullmatch(entry.name)
+        new_path = os.path.join(os.path.dirname(certificate_path("", match.group("timestamp"), output_dir)),
+                                entry.name)
+        if not dry_run:
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            os.replace(entry.path, new_path)
+            if registry is not None and match.group("kind") == "Vaccine_Certificate":
+                # Records hold the path as it was written, i.e. "certificates/..."
+                registry.move_pdf(f"{output_dir}/{entry.name}", new_path)
+        moved.append((entry.path, new_path))
+    return moved
+
+
+def prune_confirmed(registry, keep_days, output_dir=OUTPUT_DIR, dry_run=False):
+    """Delete local PDFs older than keep_days that are confirmed on Drive.
+
+    A PDF counts as confirmed when the registry records it against an
+    uploaded, public Drive file. QR images of the same issue go with
+    it. Returns the removed paths.
+    """
+    # Recorded paths are relative to the directory the app runs in
+    confirmed = {os.path.abspath(path) for path in registry.local_pdf_paths()}
+    cutoff = time.time() - keep_days * 86400
+    removed = []
+    for entry in walk_files(output_dir):
+        match = ISSUED_FILE.fullmatch(entry.name)
+        if match is None or classify(entry, output_dir) == "cache" or entry.stat().st_mtime >= cutoff:
+            continue
+        pdf_path = os.path.join(os.path.dirname(entry.path),
+                                f"Vaccine_Certificate_{match.group('cert_id')}_{match.group('timestamp')}.pdf")
+        if os.path.abspath(pdf_path) in confirmed:
+            _remove(entry.path, dry_run)
+            removed.append(entry.path)
+    return removed
+
+
+def apply_retention(output_dir=OUTPUT_DIR, registry=None, keep_days=None, render_cache=None):
+    """Run the automatic housekeeping: orphan sweep, then pruning and cache eviction if configured."""
+    removed = sweep_orphans(output_dir)
+    if registry is not None and keep_days is not None:
+        removed += prune_confirmed(registry, keep_days, output_dir)
+    if render_cache is not None:
+        render_cache.evict()
+    return removed
+
+
+def disk_report(output_dir=OUTPUT_DIR):
+    """Return {kind: {'files', 'bytes', 'oldest'}} and {day directory: files} for output_dir."""
+    kinds = {}
+    shards = {}
+    for entry in walk_files(output_dir):
+        stat = entry.stat()
+        kind = classify(entry, output_dir)
+        usage = kinds.setdefault(kind, {'files': 0, 'bytes': 0, 'oldest': stat.st_mtime})
+        usage['files'] += 1
+        usage['bytes'] += stat.st_size
+        usage['oldest'] = min(usage['oldest'], stat.st_mtime)
+        parent = os.path.basename(os.path.dirname(entry.path))
+        if kind in ("certificate", "qr"):
+            shard = parent if SHARD_DIR.fullmatch(parent) else "(unsharded)"
+            shards[shard] = shards.get(shard, 0) + 1
+    return kinds, shards
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_report(kinds, shards):
+    """Format a disk_report() result as a table."""
+    lines = [f"{'kind':<12}{'files':>8}{'size':>12}  oldest"]
+    for kind, usage in sorted(kinds.items(), key=lambda item: -item[1]['bytes']):
+        oldest = datetime.datetime.fromtimestamp(usage['oldest']).strftime("%Y-%m-%d")
+        lines.append(f"{kind:<12}{usage['files']:>8}{format_size(usage['bytes']):>12}  {oldest}")
+    total = sum(usage['bytes'] for usage in kinds.values())
+    lines.append(f"{'total':<12}{sum(u['files'] for u in kinds.values()):>8}{format_size(total):>12}")
+    unsharded = shards.pop("(unsharded)", 0)
+    if shards:
+        busiest = max(shards.items(), key=lambda item: item[1])
+        lines.append(f"{len(shards)} day directories; largest {busiest[0]} with {busiest[1]} files")
+    if unsharded:
+        lines.append(f"{unsharded} files outside day directories (python retention.py shard)")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Housekeeping for the certificates/ output directory")
+    parser.add_argument("command", choices=["report", "sweep", "shard", "prune"])
+    parser.add_argument("--dir", default=OUTPUT_DIR, help="Output directory (default: %(default)s)")
+    parser.add_argument("--registry", default="certificates/registry.db")
+    parser.add_argument("--keep-days", type=float, default=90,
+                        help="prune: keep confirmed PDFs this many days (default: %(default)s)")
+    parser.add_argument("--dry-run", action="store_true", help="List what would change without changing it")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        print(format_report(*disk_report(args.dir)))
+        return 0
+    if args.command == "sweep":
+        paths = sweep_orphans(args.dir, dry_run=args.dry_run)
+    else:
+        from registry import CertificateRegistry
+        registry = CertificateRegistry(args.registry)
+        if args.command == "shard":
+            paths = [f"{old} -> {new}" for old, new in shard_existing(args.dir, registry, args.dry_run)]
+        else:
+            paths = prune_confirmed(registry, args.keep_days, args.dir, args.dry_run)
+    for path in paths:
+        print(path)
+    verb = "would be" if args.dry_run else "were"
+    print(f"{len(paths)} files {verb} {'moved' if args.command == 'shard' else 'removed'}.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,238 @@
+"""Streaming import of travel-agency rosters (CSV, JSONL or Excel).
+
+Rows flow through a chain of generators: read, map column names to the
+certificate field names, clean, validate. Only the current row is held
+in memory, so a roster of any size can be fed straight into
+BatchIssuer.run, which applies its own bounded queue. Rows that fail
+validation are written to a rejects CSV with the reason instead of
+being issued.
+"""
+import csv
+import datetime
+import functools
+import json
+import os
+import re
+
+# Field names that certificate_template and process_certificate read
+REQUIRED_FIELDS = ['Certificate ID', 'Full Name', 'Vaccine Name', 'Date']
+DATE_FIELDS = ['Date', 'Exp Date', 'Mfg Date', 'DOB']
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y/%m/%d", "%d %b %Y", "%d %B %Y"]
+
+# Header spellings seen in agency exports and older GUI forms, keyed by
+# their normalized form (lowercase, letters and digits only)
+COLUMN_ALIASES = {
+    'name': 'Full Name',
+    'fullname': 'Full Name',
+    'patientname': 'Full Name',
+    'pilgrimname': 'Full Name',
+    'certificateid': 'Certificate ID',
+    'certid': 'Certificate ID',
+    'caseid': 'Certificate ID',
+    'invoiceno': 'Certificate ID',
+    'passport': 'Passport',
+    'passportno': 'Passport',
+    'passportnumber': 'Passport',
+    'nid': 'NID',
+    'nidno': 'NID',
+    'nationalid': 'NID',
+    'mobile': 'Mobile',
+    'mobileno': 'Mobile',
+    'phone': 'Mobile',
+    'vaccine': 'Vaccine Name',
+    'vaccinename': 'Vaccine Name',
+    'nameofvaccine': 'Vaccine Name',
+    'dose': 'Dose Information',
+    'doseinformation': 'Dose Information',
+    'numberofdose': 'Dose Information',
+    'batch': 'Batch',
+    'batchno': 'Batch',
+    'batchnumber': 'Batch',
+    'date': 'Date',
+    'dategiven': 'Date',
+    'givendate': 'Date',
+    'vaccinationdate': 'Date',
+    'expdate': 'Exp Date',
+    'expirydate': 'Exp Date',
+    'expiry': 'Exp Date',
+    'mfgdate': 'Mfg Date',
+    'manufacturingdate': 'Mfg Date',
+    'manufacturer': 'Manufacturer',
+    'mfgby': 'Manufacturer',
+    'referredby': 'Referred By',
+}
+
+
+def normalize_key(key):
+    """Return the certificate field name for a column header or form key."""
+    return COLUMN_ALIASES.get(re.sub(r"[^a-z0-9]", "", str(key).lower()), str(key).strip())
+
+
+def normalize_fields(record):
+    """Rename a record's keys to the certificate field names.
+
+    This also maps the GUI's 'Batch Number', 'Expiry Date', 'Date Given'
+    and 'Manufacturing Date' to the names the PDF reads.
+    """
+    return {normalize_key(key): value for key, value in record.items() if key is not None}
+
+
+# A roster repeats the same few dates on every row
+@functools.lru_cache(maxsize=4096)
+def parse_date(value):
+    """Return value as YYYY-MM-DD, or raise ValueError."""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime("%Y-%m-%d")
+    if ISO_DATE.fullmatch(value):
+        try:
+            return datetime.date.fromisoformat(value).isoformat()
+        except ValueError:
+            raise ValueError(f"invalid date {value!r}") from None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    raise ValueError(f"unrecognised date {value!r}")
+
+
+def read_roster(path):
+    """Yield certificate dicts from a CSV or JSONL roster, one row at a time."""
+    if path.lower().endswith((".jsonl", ".ndjson")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+
+
+def read_xlsx(path):
+    """Yield rows of the first sheet of an Excel workbook as dicts.
+
+    Needs the optional openpyxl package; the workbook is read in
+    streaming (read-only) mode.
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("Reading Excel rosters needs openpyxl (pip install openpyxl)") from None
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            return
+        for values in rows:
+            if any(value not in (None, "") for value in values):
+                yield dict(zip(headers, values))
+    finally:
+        workbook.close()
+
+
+def read_rows(path):
+    """Yield raw rows from a .csv, .jsonl or .xlsx roster."""
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        return read_xlsx(path)
+    return read_roster(path)
+
+
+def clean(record):
+    """Strip text values and normalise dates in place; return the problems found."""
+    problems = []
+    for field, value in record.items():
+        if value is None:
+            record[field] = ""
+        elif isinstance(value, str):
+            record[field] = value.strip()
+        elif isinstance(value, float) and value.is_integer():
+            # Excel turns ID and phone columns into floats
+            record[field] = str(int(value))
+        elif not isinstance(value, (datetime.date, datetime.datetime)):
+            record[field] = str(value)
+    for field in DATE_FIELDS:
+        if record.get(field):
+            try:
+                record[field] = parse_date(record[field])
+            except ValueError as e:
+                problems.append(f"{field}: {e}")
+    return problems
+
+
+def validate(record, required=REQUIRED_FIELDS):
+    """Return the validation problems of a cleaned record."""
+    problems = [f"missing {field}" for field in required if not record.get(field)]
+    if not (record.get('Passport') or record.get('NID')):
+        problems.append("missing Passport or NID")
+    if record.get('Mobile') and not re.fullmatch(r"\+?[0-9 -]{6,20}", record['Mobile']):
+        problems.append(f"invalid Mobile {record['Mobile']!r}")
+    dates = [record.get('Date', ''), record.get('Exp Date', '')]
+    if all(ISO_DATE.fullmatch(str(d)) for d in dates) and dates[1] < dates[0]:
+        problems.append("Exp Date is before the vaccination Date")
+    return problems
+
+
+class RejectsWriter:
+    """CSV of rejected rows with their row number and reasons, opened on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, row_number, reasons, record):
+        if self._writer is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(["row", "reasons", "record"])
+        self._writer.writerow([row_number, "; ".join(reasons),
+                               "; ".join(f"{k}={v}" for k, v in record.items())])
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def import_roster(path, rejects=None, required=REQUIRED_FIELDS):
+    """Yield valid certificate records from a roster file, one at a time.
+
+    rejects, a RejectsWriter, receives every row that fails validation,
+    including repeats of a Certificate ID already seen in the file.
+    """
+    seen_ids = set()
+    # Spreadsheet row numbers, counting the header as row 1
+    first_row = 1 if path.lower().endswith((".jsonl", ".ndjson")) else 2
+    for row_number, row in enumerate(read_rows(path), start=first_row):
+        record = normalize_fields(row)
+        problems = clean(record)
+        problems += validate(record, required)
+        cert_id = record.get('Certificate ID')
+        if cert_id in seen_ids:
+            problems.append(f"duplicate Certificate ID {cert_id}")
+        if problems:
+            if rejects is not None:
+                rejects.write(row_number, problems, row)
+            continue
+        seen_ids.add(cert_id)
+        yield record
+
+
+def read_cert_ids(path):
+    """Yield the Certificate ID of every roster row that has one.
+
+    Headers and values are normalised as by import_roster, but rows are
+    not otherwise validated, so a list of IDs alone is a valid roster.
+    """
+    for row in read_rows(path):
+        record = normalize_fields(row)
+        clean(record)
+        if record.get('Certificate ID'):
+            yield record['Certificate ID']
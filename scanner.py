@@ -0,0 +1,526 @@
+"""QR scanning pipeline: capture, decode and results on separate threads.
+
+A capture thread keeps only the newest one or two frames in a ring
+buffer, so a slow decode never builds up a backlog of stale frames. A
+decode thread works on downscaled grayscale crops of the newest frame
+and hands decoded payloads to a callback. Neither thread touches Tk;
+the GUI drains results on its own loop.
+
+How much work each frame gets is decided by a DecodeStrategy: a cheap
+finder-pattern check gates the full decode while no code is in view, a
+code that was found is tracked by decoding only around its last
+position, and frames are skipped when decoding falls behind a time
+budget. Per-frame timings are kept in ScanStats and can be written out
+with --timings.
+
+The source may be a camera index or a recorded video file, which makes
+the pipeline testable without a camera:
+
+    python scanner.py recording.mp4
+"""
+import argparse
+import csv
+import datetime
+import json
+import math
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+import numpy as np
+from pyzbar.pyzbar import decode
+
+from metrics import METRICS
+
+GATES = ("finder", "detector", "none")
+# path: how the frame was handled - "roi" (decoded around the tracked code),
+# "full" (whole frame decoded), "gated" (no code in view, decode skipped)
+# or "skipped" (dropped to stay within the frame budget)
+FrameTiming = namedtuple("FrameTiming", "seq path gate_ms decode_ms total_ms found")
+
+
+class RateCounter:
+    """Events per second over a sliding window."""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def tick(self):
+        now = time.monotonic()
+        with self._lock:
+            self._events.append(now)
+            while self._events and now - self._events[0] > self.window:
+                self._events.popleft()
+
+    @property
+    def rate(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._events and now - self._events[0] > self.window:
+                self._events.popleft()
+            return len(self._events) / self.window
+
+
+class ScanStats:
+    """Counters shared by the capture and decode threads."""
+
+    def __init__(self):
+        self.capture_fps = RateCounter()
+        self.decode_fps = RateCounter()
+        self.frames_captured = 0
+        self.frames_decoded = 0
+        self.frames_dropped = 0
+        self.decode_latency_ms = 0.0
+        self.scans = 0
+        self.duplicates = 0
+        self.paths = dict.fromkeys(("roi", "full", "gated", "skipped"), 0)
+        self.gate_ms = 0.0
+        # The last few hundred frames, for tuning
+        self.recent = deque(maxlen=300)
+
+    def record_decode(self, seconds):
+        self.decode_fps.tick()
+        self.frames_decoded += 1
+        # Exponential moving average keeps the reading stable
+        ms = seconds * 1000
+        self.decode_latency_ms = ms if self.frames_decoded == 1 else 0.9 * self.decode_latency_ms + 0.1 * ms
+
+    def record_frame(self, timing):
+        self.recent.append(timing)
+        self.paths[timing.path] += 1
+        if timing.path != "skipped":
+            self.gate_ms = 0.9 * self.gate_ms + 0.1 * timing.gate_ms
+
+    def summary(self):
+        paths = " ".join(f"{path}={count}" for path, count in self.paths.items() if count)
+        return (f"capture {self.capture_fps.rate:.1f} fps | decode {self.decode_fps.rate:.1f} fps | "
+                f"latency {self.decode_latency_ms:.1f} ms (gate {self.gate_ms:.1f}) | "
+                f"dropped {self.frames_dropped} | {paths or 'no frames'} | scans {self.scans}")
+
+
+class DuplicateSuppressor:
+    """Drop repeats of the same payload seen within window seconds.
+
+    A QR code held in front of the camera is decoded on every frame;
+    this turns that stream into one event per person.
+    """
+
+    def __init__(self, window=5.0):
+        self.window = window
+        self._last_seen = {}
+
+    def is_duplicate(self, payload):
+        now = time.monotonic()
+        last = self._last_seen.get(payload)
+        self._last_seen[payload] = now
+        if len(self._last_seen) > 1024:
+            self._last_seen = {p: t for p, t in self._last_seen.items() if now - t <= self.window}
+        return last is not None and now - last <= self.window
+
+
+class VerificationLog:
+    """Append-only JSON Lines log of every verified scan."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def append(self, payload, **fields):
+        entry = {"time": datetime.datetime.now().isoformat(timespec="seconds"), "payload": payload}
+        entry.update(fields)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+def preprocess_frame(frame, decode_width=640, roi=1.0):
+    """Return a grayscale, center-cropped and downscaled copy of frame.
+
+    roi is the fraction of the width and height kept around the center.
+    """
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if roi < 1.0:
+        h, w = frame.shape[:2]
+        ch, cw = int(h * roi), int(w * roi)
+        top, left = (h - ch) // 2, (w - cw) // 2
+        frame = frame[top:top + ch, left:left + cw]
+    h, w = frame.shape[:2]
+    if decode_width and w > decode_width:
+        frame = cv2.resize(frame, (decode_width, int(h * decode_width / w)), interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def count_finder_patterns(gray):
+    """Count square contours nested two deep, the shape of a QR finder pattern.
+
+    A QR code in view shows three; this is far cheaper than a decode
+    attempt on a small image.
+    """
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    contours, hierarchy = cv2.findContours(binary, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    if hierarchy is None:
+        return 0
+    # Contours with a child that itself has a child; on a busy frame
+    # there are thousands of contours, so this is done on the whole array
+    children = hierarchy[0][:, 2]
+    has_child = children != -1
+    nested = np.flatnonzero(has_child & (children[np.where(has_child, children, 0)] != -1))
+    count = 0
+    for i in nested:
+        x, y, w, h = cv2.boundingRect(contours[i])
+        if w >= 7 and 0.7 < w / h < 1.4:
+            count += 1
+    return count
+
+
+class DecodeStrategy:
+    """Decides how much decoding work each camera frame gets.
+
+    - While no code is tracked, the frame is first checked for QR finder
+      patterns at gate_width ("finder"), or with cv2.QRCodeDetector.detect
+      ("detector"); the decode runs only if the check passes, and on every
+      probe_every-th frame regardless, in case the check misses a code.
+    - After a decode, the bounding box of every code found is tracked:
+      following frames are decoded only in those boxes widened by
+      roi_margin, at full resolution, and a box is dropped once it is
+      missed roi_misses times in a row. Every probe_every-th frame the
+      whole frame is decoded as well, so a second code that comes into
+      view is picked up and tracked too.
+    - With frame_budget_ms, frames are skipped when the average frame
+      takes longer than the budget (up to max_stride - 1 in a row),
+      leaving CPU for the GUI on slow machines.
+    """
+
+    def __init__(self, decode_width=640, roi=1.0, gate="finder", gate_width=320, min_finders=3,
+                 probe_every=15, track=True, roi_margin=0.5, roi_misses=3, frame_budget_ms=None, max_stride=4):
+        if gate not in GATES:
+            raise ValueError(f"gate must be one of {GATES}, not {gate!r}")
+        self.decode_width = decode_width
+        self.roi = roi
+        self.gate = gate
+        self.gate_width = gate_width
+        self.min_finders = min_finders
+        self.probe_every = probe_every
+        self.track = track
+        self.roi_margin = roi_margin
+        self.roi_misses = roi_misses
+        self.frame_budget_ms = frame_budget_ms
+        self.max_stride = max_stride
+        # payload -> (left, top, right, bottom) in frame coordinates
+        self.boxes = {}
+        self._misses = {}
+        self._since_probe = 0
+        self._stride = 1
+        self._average_ms = 0.0
+        self._detector = cv2.QRCodeDetector() if gate == "detector" else None
+
+    def should_skip(self, seq):
+        """True if frame seq should be dropped to stay within the frame budget."""
+        return self._stride > 1 and seq % self._stride != 0
+
+    def decode(self, frame, seq=0):
+        """Return (payloads, FrameTiming) for one frame."""
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        gate_ms = decode_ms = 0.0
+        path = "full"
+        payloads = []
+        if self.boxes:
+            self._since_probe += 1
+            if self._since_probe >= self.probe_every:
+                # Look for codes that came into view while others are tracked
+                self._since_probe = 0
+                payloads, decode_ms = self._decode_region(gray, None)
+            else:
+                path = "roi"
+                payloads, decode_ms = self._decode_tracked(gray)
+        if not self.boxes and not payloads:
+            gate_start = time.perf_counter()
+            passed = self._gate_passes(gray)
+            gate_ms = (time.perf_counter() - gate_start) * 1000
+            if passed:
+                path = "full"
+                payloads, full_ms = self._decode_region(gray, None)
+                decode_ms += full_ms
+            else:
+                path = "gated"
+        total_ms = (time.perf_counter() - start) * 1000
+        self._update_stride(total_ms)
+        return payloads, FrameTiming(seq, path, gate_ms, decode_ms, total_ms, len(payloads))
+
+    def _gate_passes(self, gray):
+        self._since_probe += 1
+        if self.gate == "none" or self._since_probe >= self.probe_every:
+            self._since_probe = 0
+            return True
+        small = preprocess_frame(gray, self.gate_width, self.roi)
+        if self._detector is not None:
+            return self._detector.detect(small)[0]
+        return count_finder_patterns(small) >= self.min_finders
+
+    def _decode_tracked(self, gray):
+        """Decode every tracked box, dropping those missed roi_misses times in a row."""
+        payloads = []
+        decode_ms = 0.0
+        for payload, box in list(self.boxes.items()):
+            found, ms = self._decode_region(gray, box)
+            decode_ms += ms
+            payloads.extend(data for data in found if data not in payloads)
+            if payload in found:
+                continue
+            self._misses[payload] = self._misses.get(payload, 0) + 1
+            if self._misses[payload] >= self.roi_misses:
+                # Lost it; once no box is left the whole frame is searched again
+                del self.boxes[payload]
+                del self._misses[payload]
+        return payloads, decode_ms
+
+    def _decode_region(self, gray, box):
+        """Decode the (centre-cropped, downscaled) frame, or only box at full resolution."""
+        h, w = gray.shape[:2]
+        if box is None:
+            ch, cw = int(h * self.roi), int(w * self.roi)
+            left, top = (w - cw) // 2, (h - ch) // 2
+            right, bottom = left + cw, top + ch
+        else:
+            left, top, right, bottom = box
+        region = gray[top:bottom, left:right]
+        scale = 1.0
+        if box is None and self.decode_width and region.shape[1] > self.decode_width:
+            scale = region.shape[1] / self.decode_width
+            region = cv2.resize(region, (self.decode_width, int(region.shape[0] / scale)),
+                                interpolation=cv2.INTER_AREA)
+        start = time.perf_counter()
+        barcodes = decode(region)
+        decode_ms = (time.perf_counter() - start) * 1000
+        payloads = [barcode.data.decode("utf-8") for barcode in barcodes]
+        if self.track:
+            for payload, barcode in zip(payloads, barcodes):
+                # Map each code's rectangle back to frame coordinates
+                rect = barcode.rect
+                margin_x, margin_y = rect.width * scale * self.roi_margin, rect.height * scale * self.roi_margin
+                self.boxes[payload] = (max(0, int(left + rect.left * scale - margin_x)),
+                                       max(0, int(top + rect.top * scale - margin_y)),
+                                       min(w, int(left + (rect.left + rect.width) * scale + margin_x)),
+                                       min(h, int(top + (rect.top + rect.height) * scale + margin_y)))
+                self._misses[payload] = 0
+        return payloads, decode_ms
+
+    def _update_stride(self, total_ms):
+        if not self.frame_budget_ms:
+            return
+        self._average_ms = 0.8 * self._average_ms + 0.2 * total_ms
+        self._stride = max(1, min(self.max_stride, math.ceil(self._average_ms / self.frame_budget_ms)))
+
+
+class ScanPipeline:
+    """Threaded QR scanner over a camera or a video file.
+
+    on_result(qr_data) is called from the decode thread for every QR
+    code found. With stop_on_result the pipeline stops after the first
+    one; otherwise it keeps the camera open and reports every code in
+    view, dropping repeats of a payload within dedupe_window seconds and
+    appending each reported scan to log (a VerificationLog) if given.
+
+    strategy, a DecodeStrategy, defaults to one built from decode_width
+    and roi. on_frame(timing), if given, gets the FrameTiming of every
+    frame the decode thread takes.
+    """
+
+    def __init__(self, source=0, on_result=None, stop_on_result=True, buffer_size=2,
+                 decode_width=640, roi=1.0, realtime=True, dedupe_window=5.0, log=None,
+                 strategy=None, on_frame=None):
+        self.source = source
+        self.on_result = on_result
+        self.stop_on_result = stop_on_result
+        self.suppressor = DuplicateSuppressor(dedupe_window)
+        self.log = log
+        self.strategy = strategy or DecodeStrategy(decode_width, roi)
+        self.on_frame = on_frame
+        # Play video files back at their recorded frame rate, like a camera
+        self.realtime = realtime
+        self.stats = ScanStats()
+        self._frames = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._new_frame = threading.Condition()
+        self._running = threading.Event()
+        self._finished = threading.Event()
+        self._threads = []
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    def start(self):
+        self._running.set()
+        self._finished.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="scan-capture", daemon=True),
+            threading.Thread(target=self._decode_loop, name="scan-decode", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._running.clear()
+        with self._new_frame:
+            self._new_frame.notify_all()
+
+    def join(self, timeout=None):
+        """Wait until both threads have exited."""
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def wait(self, timeout=None):
+        """Block until the pipeline stops; returns False on timeout."""
+        return self._finished.wait(timeout)
+
+    def latest_frame(self):
+        """Return the newest captured frame (for preview) or None."""
+        with self._new_frame:
+            return self._frames[-1][1] if self._frames else None
+
+    def _capture_loop(self):
+        cap = cv2.VideoCapture(self.source)
+        is_file = isinstance(self.source, str)
+        interval = 0.0
+        if is_file and self.realtime:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            interval = 1.0 / fps if fps and fps > 0 else 1.0 / 30
+        next_frame = time.monotonic()
+        try:
+            if not cap.isOpened():
+                return
+            while self._running.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    if is_file:
+                        # End of the recording
+                        break
+                    # Camera hiccup: back off instead of spinning
+                    time.sleep(0.01)
+                    continue
+                self.stats.capture_fps.tick()
+                self.stats.frames_captured += 1
+                with self._new_frame:
+                    self._seq += 1
+                    self._frames.append((self._seq, frame))
+                    self._new_frame.notify()
+                if interval:
+                    next_frame += interval
+                    delay = next_frame - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+        finally:
+            cap.release()
+            self.stop()
+
+    def _decode_loop(self):
+        last_seq = 0
+        try:
+            while True:
+                with self._new_frame:
+                    while self._running.is_set() and (not self._frames or self._frames[-1][0] == last_seq):
+                        self._new_frame.wait(0.5)
+                    if not self._frames or self._frames[-1][0] == last_seq:
+                        return
+                    seq, frame = self._frames[-1]
+                # Frames superseded before the decoder got to them
+                self.stats.frames_dropped += seq - last_seq - 1
+                METRICS.inc('scan_frames_total', seq - last_seq - 1, outcome="dropped")
+                last_seq = seq
+
+                if self.strategy.should_skip(seq):
+                    payloads, timing = [], FrameTiming(seq, "skipped", 0.0, 0.0, 0.0, 0)
+                else:
+                    payloads, timing = self.strategy.decode(frame, seq)
+                    self.stats.record_decode(timing.total_ms / 1000)
+                    METRICS.observe('scan_frame_seconds', timing.total_ms / 1000, path=timing.path)
+                    if timing.decode_ms:
+                        METRICS.observe('scan_decode_seconds', timing.decode_ms / 1000)
+                METRICS.inc('scan_frames_total', outcome=timing.path)
+                self.stats.record_frame(timing)
+                if self.on_frame:
+                    self.on_frame(timing)
+
+                for qr_data in payloads:
+                    if self.suppressor.is_duplicate(qr_data):
+                        self.stats.duplicates += 1
+                        METRICS.inc('scans_total', outcome="duplicate")
+                        continue
+                    self.stats.scans += 1
+                    METRICS.inc('scans_total', outcome="new")
+                    METRICS.log("scan", source=str(self.source), payload_length=len(qr_data))
+                    if self.log:
+                        self.log.append(qr_data, source=str(self.source))
+                    if self.on_result:
+                        self.on_result(qr_data)
+                    if self.stop_on_result:
+                        self.stop()
+                        return
+        finally:
+            self._finished.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan QR codes from a camera or video file")
+    parser.add_argument("source", nargs="?", default="0", help="Camera index or video file path")
+    parser.add_argument("--decode-width", type=int, default=640)
+    parser.add_argument("--roi", type=float, default=1.0)
+    parser.add_argument("--fast", action="store_true", help="Read video files as fast as possible")
+    parser.add_argument("--dedupe-window", type=float, default=5.0,
+                        help="Seconds during which a repeated payload is ignored")
+    parser.add_argument("--log", help="Append every verified scan to this JSON Lines file")
+    parser.add_argument("--verify", metavar="KEY_FILE",
+                        help="Check each scan against the registry using this signing key")
+    parser.add_argument("--registry", default="certificates/registry.db")
+    parser.add_argument("--gate", choices=GATES, default="finder",
+                        help="Cheap QR-presence check run before a full decode")
+    parser.add_argument("--no-track", action="store_true", help="Always decode the whole frame")
+    parser.add_argument("--frame-budget", type=float, metavar="MS",
+                        help="Skip frames while the average frame takes longer than this")
+    parser.add_argument("--timings", metavar="CSV", help="Write the timings of every frame to this file")
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    log = VerificationLog(args.log) if args.log else None
+    on_result = print
+    if args.verify:
+        from registry import CertificateRegistry
+        from verifier import Verifier, format_result, load_signing_key
+        verifier = Verifier(CertificateRegistry(args.registry), load_signing_key(args.verify))
+        on_result = lambda qr_data: print(format_result(verifier.verify(qr_data)))
+    strategy = DecodeStrategy(args.decode_width, args.roi, gate=args.gate, track=not args.no_track,
+                              frame_budget_ms=args.frame_budget)
+    timings_file = open(args.timings, "w", newline="", encoding="utf-8") if args.timings else None
+    on_frame = None
+    if timings_file:
+        writer = csv.writer(timings_file)
+        writer.writerow(FrameTiming._fields)
+        on_frame = lambda timing: writer.writerow(
+            [round(value, 3) if isinstance(value, float) else value for value in timing])
+    pipeline = ScanPipeline(source, on_result=on_result, stop_on_result=False, realtime=not args.fast,
+                            dedupe_window=args.dedupe_window, log=log, strategy=strategy, on_frame=on_frame)
+    pipeline.start()
+    try:
+        while not pipeline.wait(1.0):
+            print(pipeline.stats.summary())
+    except KeyboardInterrupt:
+        pipeline.stop()
+    pipeline.join()
+    if timings_file:
+        timings_file.close()
+    print(pipeline.stats.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Upload state shared by every Drive upload in the process.
+
+UPLOAD_LIMITER caps the combined upload bandwidth of all concurrent
+uploads, so a batch at the counter does not saturate the clinic's line
+(see BandwidthLimiter). UploadSessions remembers the session URI of
+each resumable upload in progress, so an upload interrupted by a
+dropped connection or a restart continues where it stopped instead of
+starting over.
+"""
+import datetime
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_SESSIONS_PATH = "certificates/uploads.db"
+# Drive forgets resumable sessions after a week
+SESSION_MAX_AGE = datetime.timedelta(days=6)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    uri TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+
+class BandwidthLimiter:
+    """Token bucket limiting the bytes per second sent by all uploads together.
+
+    acquire(n) takes n tokens, waiting as long as needed for the bucket
+    to refill. Callers may go into debt, so a large request is never
+    starved and concurrent callers are served in turn. A rate of None
+    means unlimited.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self._lock = threading.Lock()
+        self.configure(rate, burst)
+
+    def configure(self, rate, burst=None):
+        """Set the rate in bytes/sec; burst defaults to a quarter second's worth."""
+        with self._lock:
+            self.rate = rate
+            self.burst = burst or (rate / 4 if rate else 0)
+            self._tokens = self.burst
+            self._updated = time.monotonic()
+
+    def acquire(self, size):
+        """Wait until size bytes may be sent; returns the seconds waited."""
+        with self._lock:
+            if not self.rate:
+                return 0.0
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= size
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def wrap(self, stream):
+        """Return stream with every read paced by this limiter."""
+        return ThrottledStream(stream, self)
+
+
+class ThrottledStream:
+    """File-like wrapper whose reads wait for bandwidth tokens.
+
+    http.client sends a file-like body in 8 KiB reads, so uploads from
+    it are shaped smoothly rather than in chunk-sized bursts.
+    """
+
+    def __init__(self, stream, limiter):
+        self._stream = stream
+        self._limiter = limiter
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self._limiter.acquire(len(data))
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._stream.seek(offset, whence)
+
+    def tell(self):
+        return self._stream.tell()
+
+    def close(self):
+        self._stream.close()
+
+
+UPLOAD_LIMITER = BandwidthLimiter()
+
+
+class UploadSessions:
+    """Persisted session URIs of resumable uploads that have not finished.
+
+    Sessions are keyed by the Drive file ID (or name) and stored with a
+    digest of the content, so a session is only resumed for the same
+    bytes it was started with.
+    """
+
+    def __init__(self, path=DEFAULT_SESSIONS_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def get(self, key, digest):
+        """Return the session URI to resume for key, or None."""
+        cutoff = (datetime.datetime.now() - SESSION_MAX_AGE).isoformat(timespec="seconds")
+        with self._lock:
+            row = self._conn.execute("SELECT uri, digest, created_at FROM sessions WHERE key = ?",
+                                     (key,)).fetchone()
+        if row is None or row[1] != digest or row[2] < cutoff:
+            return None
+        return row[0]
+
+    def save(self, key, digest, size, uri):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (key, digest, size, uri, created_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET digest = excluded.digest, size = excluded.size, "
+                "uri = excluded.uri, created_at = CASE WHEN sessions.uri = excluded.uri "
+                "THEN sessions.created_at ELSE excluded.created_at END",
+                (key, digest, size, uri, datetime.datetime.now().isoformat(timespec="seconds"))
+            )
+
+    def discard(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    def pending(self):
+        """Return (key, size, created_at) of every stored session."""
+        with self._lock:
+            return self._conn.execute("SELECT key, size, created_at FROM sessions ORDER BY created_at").fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,117 @@
+import os
+import re
+import time
+from collections import namedtuple
+
+from qr_payload import decode_payload, is_compact_payload, verify_signature
+
+VALID = "valid"
+INVALID = "invalid"
+REVOKED = "revoked"
+
+DEFAULT_KEY_PATH = "certificates/signing.key"
+DRIVE_LINK = re.compile(r"^https://drive\.google\.com/file/d/([A-Za-z0-9_-]+)")
+
+VerificationResult = namedtuple("VerificationResult", "status cert_id reason fields elapsed_ms")
+
+
+def load_signing_key(path=DEFAULT_KEY_PATH):
+    """Read a hex-encoded HMAC signing key."""
+    try:
+        with open(path, encoding="ascii") as f:
+            return bytes.fromhex(f.read().strip())
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Signing key not found at {path}; copy it from the issuing machine") from None
+
+
+def load_or_create_signing_key(path=DEFAULT_KEY_PATH):
+    """Read the signing key, generating a new random one on first use.
+
+    Only the issuing machine should create the key; verification gates
+    get a copy of the same file.
+    """
+    if os.path.exists(path):
+        return load_signing_key(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    key = os.urandom(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(key.hex())
+    return key
+
+
+class Verifier:
+    """Offline certificate check for scanned QR codes.
+
+    Signed compact payloads are checked against the HMAC key, then the
+    Certificate ID is looked up in the local registry, which serves as
+    both the issuance and the revocation index; a payload naming another
+    Drive file than the record is from an earlier, replaced issue.
+    Drive-link QR codes carry no signature, so for those only the
+    registry lookup by Drive file ID applies. No network access is
+    involved.
+    """
+
+    def __init__(self, registry, signing_key):
+        self.registry = registry
+        self.signing_key = signing_key
+
+    def verify(self, qr_data):
+        """Return a VerificationResult with status valid, invalid or revoked."""
+        start = time.perf_counter()
+        status, cert_id, reason, fields = self._check(qr_data)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return VerificationResult(status, cert_id, reason, fields, elapsed_ms)
+
+    def verify_id(self, cert_id):
+        """Check a Certificate ID typed in by hand, without a QR payload."""
+        start = time.perf_counter()
+        record = self.registry.get(cert_id)
+        status, reason, fields = self._status(record)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return VerificationResult(status, cert_id, reason, fields, elapsed_ms)
+
+    def _check(self, qr_data):
+        if is_compact_payload(qr_data):
+            try:
+                fields = decode_payload(qr_data)
+                signed = verify_signature(qr_data, self.signing_key)
+            except ValueError as e:
+                return INVALID, None, f"malformed payload: {e}", None
+            cert_id = fields.get('Certificate ID')
+            if not signed:
+                return INVALID, cert_id, "missing or bad signature", fields
+            record = self.registry.get(cert_id)
+            if record and record['drive_file_id'] and fields.get('drive_file_id') not in ('', record['drive_file_id']):
+                return INVALID, cert_id, "replaced by a later issue", fields
+        else:
+            match = DRIVE_LINK.match(qr_data)
+            if not match:
+                return INVALID, None, "not a certificate QR code", None
+            records = self.registry.find(drive_file_id=match.group(1))
+            record = records[0] if records else None
+            fields = record['data'] if record else None
+            cert_id = record['cert_id'] if record else None
+
+        status, reason, record_fields = self._status(record)
+        return status, cert_id, reason, fields or record_fields
+
+    @staticmethod
+    def _status(record):
+        if record is None:
+            return INVALID, "not in the issuance index", None
+        if record['revoked_at']:
+            return REVOKED, record['revoked_reason'] or "revoked", record['data']
+        return VALID, "", record['data']
+
+
+def format_result(result):
+    """Format a VerificationResult for display."""
+    text = f"{result.status.upper()}"
+    if result.cert_id:
+        text += f" - {result.cert_id}"
+    if result.reason:
+        text += f" ({result.reason})"
+    return f"{text} [{result.elapsed_ms:.1f} ms]"
@@ -0,0 +1,224 @@
+"""LAN verification service for gate devices.
+
+    python verify_server.py --host 0.0.0.0 --port 8780
+
+Gate devices send what they scanned and get back the same verdict the
+scanner shows (VALID, INVALID or REVOKED, see verifier.py):
+
+    GET  /verify?qr=<decoded QR text>
+    GET  /verify?id=<Certificate ID>
+    POST /verify      body: the decoded QR text, or JSON {"qr": ...} / {"id": ...}
+    GET  /health
+
+Answers come from an in-memory index of the registry, so a request
+never waits on SQLite. The index is loaded once at startup and then
+topped up every few seconds with the certificates issued or revoked
+since the last reload, so new issues are verifiable almost at once.
+Only the standard library is used: a small HTTP/1.1 server on asyncio
+with keep-alive.
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from registry import DEFAULT_REGISTRY_PATH, CertificateRegistry
+from verifier import DEFAULT_KEY_PATH, Verifier, load_signing_key
+
+DEFAULT_PORT = 8780
+RELOAD_INTERVAL = 2.0
+MAX_BODY = 64 * 1024
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+class HotIndex:
+    """In-memory copy of the registry that answers Verifier lookups.
+
+    Only what verification needs is kept per certificate, with the
+    certificate data left as JSON text until a lookup needs it.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        # cert_id -> (drive_file_id, revoked_at, revoked_reason, data JSON)
+        self._records = {}
+        self._by_file_id = {}
+        self._since = None
+        self.loaded_at = None
+
+    def __len__(self):
+        return len(self._records)
+
+    def fetch(self):
+        """Read the rows changed since the last reload (slow; run off the event loop)."""
+        return self.registry.changes_since(self._since)
+
+    def apply(self, rows):
+        """Add fetched rows to the index; returns how many there were."""
+        for row in rows:
+            old = self._records.get(row['cert_id'])
+            if old is not None and old[0] != row['drive_file_id']:
+                self._by_file_id.pop(old[0], None)
+            self._records[row['cert_id']] = (row['drive_file_id'], row['revoked_at'], row['revoked_reason'],
+                                             row['data'])
+            if row['drive_file_id']:
+                self._by_file_id[row['drive_file_id']] = row['cert_id']
+            # Timestamps have one-second resolution, so the next reload
+            # re-reads this second rather than risk missing a row
+            for stamp in (row['issued_at'], row['revoked_at']):
+                if stamp and (self._since is None or stamp > self._since):
+                    self._since = stamp
+        self.loaded_at = time.time()
+        return len(rows)
+
+    def get(self, cert_id):
+        entry = self._records.get(cert_id)
+        if entry is None:
+            return None
+        drive_file_id, revoked_at, revoked_reason, data = entry
+        return {'cert_id': cert_id, 'drive_file_id': drive_file_id, 'revoked_at': revoked_at,
+                'revoked_reason': revoked_reason, 'data': json.loads(data)}
+
+    def find(self, drive_file_id):
+        cert_id = self._by_file_id.get(drive_file_id)
+        return [self.get(cert_id)] if cert_id is not None else []
+
+
+class VerifyServer:
+    """asyncio HTTP front end for a Verifier backed by a HotIndex."""
+
+    def __init__(self, registry, signing_key, reload_interval=RELOAD_INTERVAL):
+        self.index = HotIndex(registry)
+        self.verifier = Verifier(self.index, signing_key)
+        self.reload_interval = reload_interval
+        self.requests = 0
+
+    async def reload(self):
+        rows = await asyncio.get_running_loop().run_in_executor(None, self.index.fetch)
+        return self.index.apply(rows)
+
+    async def _reload_forever(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                print(f"Reload failed: {e}")
+
+    def handle(self, method, target, body):
+        """Return (status, JSON-serialisable response) for one request."""
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {'certificates': len(self.index), 'loaded_at': self.index.loaded_at,
+                         'requests': self.requests}
+        if url.path != "/verify":
+            return 404, {'error': "not found"}
+        if method == "GET":
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        elif method == "POST":
+            text = body.decode("utf-8", errors="replace").strip()
+            try:
+                params = json.loads(text) if text.startswith("{") else {'qr': text}
+            except ValueError:
+                return 400, {'error': "malformed JSON body"}
+        else:
+            return 405, {'error': "use GET or POST"}
+        if any(not isinstance(params.get(key, ""), str) for key in ('qr', 'id')):
+            return 400, {'error': "qr and id must be strings"}
+        if params.get('qr'):
+            result = self.verifier.verify(params['qr'])
+        elif params.get('id'):
+            result = self.verifier.verify_id(params['id'])
+        else:
+            return 400, {'error': "give a qr or id parameter"}
+        self.requests += 1
+        return 200, result._asdict()
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # The body cannot be skipped, so the connection is closed after answering
+                    status, response = 400, {'error': "invalid Content-Length"}
+                    keep_alive = False
+                elif length > MAX_BODY:
+                    status, response = 413, {'error': "request body too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, response = self.handle(method, target, body)
+                    keep_alive = (headers.get("connection", "").lower() != "close"
+                                  and version != "HTTP/1.0")
+                data = json.dumps(response).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, ready=None):
+        """Load the index and serve until cancelled; ready(server), if given, is called once listening."""
+        start = time.perf_counter()
+        count = await self.reload()
+        print(f"Indexed {count} certificates in {time.perf_counter() - start:.2f}s")
+        server = await asyncio.start_server(self._serve_connection, host, port)
+        reloader = asyncio.create_task(self._reload_forever())
+        print(f"Verifying on http://{host}:{server.sockets[0].getsockname()[1]}/verify")
+        if ready is not None:
+            ready(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            reloader.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve certificate verification to gate devices")
+    parser.add_argument("--host", default="127.0.0.1", help="Use 0.0.0.0 to accept requests from the LAN")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--registry", default=DEFAULT_REGISTRY_PATH)
+    parser.add_argument("--signing-key", default=DEFAULT_KEY_PATH,
+                        help="Copy of the issuing machine's signing key")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL,
+                        help="Seconds between picking up newly issued or revoked certificates")
+    args = parser.parse_args()
+
+    server = VerifyServer(CertificateRegistry(args.registry), load_signing_key(args.signing_key),
+                          args.reload_interval)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())